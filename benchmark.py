@@ -0,0 +1,337 @@
+"""Times the InventoryApp hot paths on generated catalogs, without a display.
+
+    python benchmark.py                      # 1k, 10k and 100k products
+    python benchmark.py --sizes 1000 10000
+    python benchmark.py --save-baseline      # record this machine's numbers
+
+Each size gets a seeded catalog with realistic model and color fan-out and a
+multi-year order history, written to a scratch folder in the same files the
+app uses. Every operation reports its best wall time over ``--repeat`` runs
+and its peak Python memory in one more run under tracemalloc. With a
+baseline file present, any operation slower or hungrier than the baseline
+by more than the tolerance is reported and the exit status is 1.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QDate
+from PyQt5.QtWidgets import QApplication, QDialog, QMessageBox
+from storage import InventoryStore
+from journal import OrderJournal, ORDER_DATE_FORMAT
+from ledger import TransactionLedger, TRANSACTION_DATE_FORMAT
+from sales import apply_refund, apply_sale, order_record, refund_record
+import main
+
+SIZES = [1000, 10000, 100000]
+BASELINE_FILE = 'benchmark_baselines.json'
+SNAPSHOT_FILES = ['inventory.snapshot', 'orders.snapshot']
+TIME_SLACK = 0.01  # Seconds; timer noise on the fastest operations
+MEMORY_SLACK = 1.0  # MB
+RECEIPTS = 100
+
+CATEGORIES = ["Cases", "Screen Protectors", "Chargers", "Headphones", "Speakers", "Cables", "Power Banks", "Mounts", "Stands", "Other"]
+BRANDS = ["Anker", "Spigen", "Baseus", "Ugreen", "Belkin", "OtterBox", "ESR", "JBL", "Sony", "Xiaomi", "Samsung", "Apple", "Generic"]
+KINDS = {
+    "Cases": ["Clear Case", "Rugged Case", "Wallet Case", "Silicone Case"],
+    "Screen Protectors": ["Tempered Glass", "Privacy Glass", "Matte Film"],
+    "Chargers": ["20W Charger", "65W GaN Charger", "Wireless Pad", "Car Charger"],
+    "Headphones": ["Earbuds", "Over-Ear Headphones", "Neckband"],
+    "Speakers": ["Mini Speaker", "Party Speaker"],
+    "Cables": ["USB-C Cable", "Lightning Cable", "Braided Cable"],
+    "Power Banks": ["10000mAh Power Bank", "20000mAh Power Bank"],
+    "Mounts": ["Car Mount", "Bike Mount"],
+    "Stands": ["Desk Stand", "Foldable Stand"],
+    "Other": ["Pop Grip", "Lanyard", "SIM Tool"],
+}
+# Cases and screen protectors are made per phone model, the rest mostly fit any phone
+PER_PHONE_CATEGORIES = {"Cases", "Screen Protectors"}
+PHONE_MODELS = ([f"iPhone {n}{suffix}" for n in range(11, 17) for suffix in ("", " Plus", " Pro", " Pro Max")]
+                + [f"Galaxy S{n}{suffix}" for n in range(20, 26) for suffix in ("", "+", " Ultra")]
+                + [f"Galaxy A{n}" for n in (12, 13, 14, 15, 24, 25, 34, 35, 54, 55)]
+                + [f"Redmi Note {n}{suffix}" for n in range(9, 14) for suffix in ("", " Pro")]
+                + [f"Pixel {n}{suffix}" for n in range(6, 10) for suffix in ("", " Pro", "a")])
+COLORS = ["Black", "White", "Clear", "Blue", "Navy", "Red", "Pink", "Green", "Purple", "Gold", "Silver", "Gray", "Orange", "Yellow"]
+
+
+def generate_catalog(directory, size, seed, years=3, orders_per_product=2):
+    """Writes inventory.db, orders.journal and transactions.journal for ``size`` products.
+
+    Orders are spread over ``years`` up to now, with a few best sellers taking
+    most of them and about 3% refunded; the units sold counters match them.
+    """
+    rng = random.Random(seed)
+    products = []
+    for number in range(size):
+        category = rng.choice(CATEGORIES)
+        if category in PER_PHONE_CATEGORIES:
+            models = rng.sample(PHONE_MODELS, rng.randint(2, 10))
+        else:
+            models = ["Universal"] if rng.random() < 0.6 else rng.sample(PHONE_MODELS, rng.randint(1, 3))
+        data = {}
+        for model in models:
+            price = round(rng.uniform(3, 80), 2)
+            colors = rng.sample(COLORS, rng.randint(1, 6))
+            data[model] = {'Price': price, 'Fee': round(price * rng.uniform(0.05, 0.3), 2),
+                           'Colors': {color: rng.randint(50, 400) for color in colors}}
+        products.append((f"{rng.choice(BRANDS)} {rng.choice(KINDS[category])} {number + 1}", category, data, ""))
+
+    end = datetime.datetime.now().replace(microsecond=0)
+    start = end - datetime.timedelta(days=365 * years)
+    span = int((end - start).total_seconds())
+    weights = [1.0 / (rank + 1) for rank in range(size)]  # Zipf-like popularity
+    rng.shuffle(weights)
+    buyers = rng.choices(range(size), weights=weights, k=size * orders_per_product)
+    moments = sorted(start + datetime.timedelta(seconds=rng.randrange(span)) for _ in buyers)
+
+    orders = []
+    for number, (product, moment) in enumerate(zip(buyers, moments)):
+        item_name, _, data, _ = products[product]
+        model = rng.choice(list(data))
+        model_data = data[model]
+        color = rng.choice(list(model_data['Colors']))
+        quantity = min(rng.choice([1, 1, 1, 2, 2, 3, 5]), model_data['Colors'][color])
+        if not quantity:
+            continue
+        apply_sale(model_data, color, quantity)
+        orders.append(order_record(f"Order {number + 1}", item_name, model, model_data, color, quantity,
+                                   rng.choice([0.0, 0.0, 2.5, 5.0]), moment.strftime(ORDER_DATE_FORMAT)))
+        if rng.random() < 0.03:
+            refund_date = min(moment + datetime.timedelta(days=rng.randint(1, 14)), end)
+            apply_refund(model_data, color, quantity)
+            orders.append(refund_record(item_name, model, model_data, color, quantity, 0.0, refund_date))
+
+    store = InventoryStore(os.path.join(directory, 'inventory.db'))
+    store.import_products(products)
+    store.close()
+
+    journal = OrderJournal(os.path.join(directory, 'orders.journal'))
+    journal.extend(orders)
+    journal.close()
+
+    ledger = TransactionLedger(os.path.join(directory, 'transactions.journal'))
+    ledger.extend([{'Title': "Rent", 'Description': "Shop rent", 'Date': (start + datetime.timedelta(days=day)).strftime(TRANSACTION_DATE_FORMAT),
+                    'Fees': round(rng.uniform(200, 400), 2)} for day in range(0, 365 * years, 30)])
+    ledger.close()
+    return products
+
+
+@contextmanager
+def unattended_dialogs():
+    """Lets handlers open dialogs and message boxes without waiting for a click.
+
+    Warnings are collected and raised afterwards, since a handler that
+    refused its input did not do the work being timed.
+    """
+    warnings = []
+    patched = {
+        (QDialog, 'exec_'): lambda self: QDialog.Accepted,
+        (QMessageBox, 'information'): staticmethod(lambda *args, **kwargs: QMessageBox.Ok),
+        (QMessageBox, 'question'): staticmethod(lambda *args, **kwargs: QMessageBox.Yes),
+        (QMessageBox, 'warning'): staticmethod(lambda parent, title, text, *args: warnings.append(text) or QMessageBox.Ok),
+    }
+    originals = {target: target[0].__dict__[target[1]] for target in patched}
+    for (owner, name), replacement in patched.items():
+        setattr(owner, name, replacement)
+    try:
+        yield warnings
+    finally:
+        for (owner, name), original in originals.items():
+            setattr(owner, name, original)
+
+
+def measure(action, setup=None, teardown=None, repeat=3):
+    """Returns (best seconds, peak MB) for ``action(setup())``.
+
+    The timed runs are untraced; the peak comes from one extra run with
+    tracemalloc on, which counts allocations from every thread.
+    """
+    best = None
+    for run in range(repeat + 1):
+        context = setup() if setup else None
+        gc.collect()
+        traced = run == repeat
+        if traced:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            action(context)
+            elapsed = time.perf_counter() - started
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            if traced:
+                tracemalloc.stop()
+            if teardown:
+                teardown(context)
+        if not traced:
+            best = elapsed if best is None else min(best, elapsed)
+    return best, peak
+
+
+def start_app():
+    app = main.InventoryApp()
+    app.wait_for_orders()
+    return app
+
+
+def close_app(app):
+    app.close()
+    app.deleteLater()
+    QApplication.processEvents()
+
+
+def remove_snapshots():
+    for path in SNAPSHOT_FILES:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def benchmark_size(size, seed, repeat):
+    """Runs every operation on a fresh catalog of ``size`` products; returns {operation: (seconds, MB)}."""
+    results = {}
+    generate_catalog('.', size, seed)
+    rng = random.Random(seed)
+    started = []
+
+    def run(operation, action, setup=None, teardown=None, runs=repeat):
+        results[operation] = measure(action, setup, teardown, runs)
+        print(f"  {operation:<26}{results[operation][0]:>10.4f}s{results[operation][1]:>10.1f} MB", flush=True)
+
+    # Loading: from the database, then from the snapshots the previous close wrote
+    run('load_inventory', lambda _: started.append(start_app()),
+        setup=remove_snapshots, teardown=lambda _: close_app(started.pop()))
+    run('load_inventory_snapshot', lambda _: started.append(start_app()),
+        teardown=lambda _: close_app(started.pop()))
+    # Closing waits for queued writes and saves the snapshots
+    run('close', lambda app: app.close(), setup=start_app, teardown=close_app)
+
+    app = start_app()
+    run('export_inventory', lambda _: app.store.export_excel(app.inventory_file), runs=1)
+    run('update_inventory_view', lambda _: app.update_inventory_view())
+
+    def set_filters(query="", model_position=0, category_position=0):
+        for widget in (app.search_bar, app.phone_model_dropdown, app.category_filter):
+            widget.blockSignals(True)
+        app.search_bar.setText(query)
+        app.phone_model_dropdown.setCurrentIndex(model_position)
+        app.category_filter.setCurrentIndex(category_position)
+        for widget in (app.search_bar, app.phone_model_dropdown, app.category_filter):
+            widget.blockSignals(False)
+
+    run('apply_filters_name', lambda _: app.apply_filters(), setup=lambda: set_filters(query="case 1"))
+    run('apply_filters_model', lambda _: app.apply_filters(),
+        setup=lambda: set_filters(model_position=app.phone_model_dropdown.findText(PHONE_MODELS[0])))
+    run('apply_filters_category', lambda _: app.apply_filters(), setup=lambda: set_filters(category_position=1))
+    set_filters()
+
+    def sell(product_ids):
+        for product_id in product_ids:
+            app.order_product(product_id)
+            app.order_quantity_entry.setText("1")
+            app.generate_receipt(product_id)
+
+    def stocked_products():
+        # The order dialog preselects the first model and color
+        def first_color_stock(product_id):
+            model_data = next(iter(app.inventory_df.at[product_id, 'Data'].values()))
+            return next(iter(model_data['Colors'].values()), 0)
+        ids = app.inventory_df.index.tolist()
+        return [product_id for product_id in rng.sample(ids, len(ids)) if first_color_stock(product_id) > 0][:RECEIPTS]
+
+    run(f'generate_receipt_x{RECEIPTS}', sell, setup=stocked_products, teardown=lambda _: app.persistence.flush())
+
+    def open_performance():
+        app.open_performance_window()
+        app.start_date_edit.setDate(QDate.currentDate().addYears(-5))
+
+    run('track_performance', lambda _: app.track_performance(), setup=open_performance,
+        teardown=lambda _: app.persistence.flush())
+    close_app(app)
+    return results
+
+
+def compare(results, baselines, tolerance):
+    """Returns a message for every operation worse than its baseline by more than ``tolerance``."""
+    regressions = []
+    for name, (seconds, megabytes) in results.items():
+        if name not in baselines:
+            continue
+        base_seconds, base_megabytes = baselines[name]
+        if seconds > base_seconds * tolerance + TIME_SLACK:
+            regressions.append(f"{name}: {seconds:.4f}s against a baseline of {base_seconds:.4f}s")
+        if megabytes > base_megabytes * tolerance + MEMORY_SLACK:
+            regressions.append(f"{name}: {megabytes:.1f} MB against a baseline of {base_megabytes:.1f} MB")
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark the InvMan hot paths on generated catalogs.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help="catalog sizes in products (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=2024, help="generator seed (default: %(default)s)")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per operation (default: %(default)s)")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="baseline file (default: %(default)s)")
+    parser.add_argument('--tolerance', type=float, default=1.5,
+                        help="allowed ratio to the baseline before a run counts as a regression (default: %(default)s)")
+    parser.add_argument('--save-baseline', action='store_true', help="write this run's numbers to the baseline file")
+    return parser
+
+
+def main_benchmark(argv=None):
+    args = build_parser().parse_args(argv)
+    baseline_path = os.path.abspath(args.baseline)
+    application = QApplication.instance() or QApplication(sys.argv)
+    results = {}
+    home = os.getcwd()
+    for size in args.sizes:
+        print(f"{size} products:", flush=True)
+        workdir = tempfile.mkdtemp(prefix=f"invman-bench-{size}-")
+        os.chdir(workdir)
+        try:
+            with unattended_dialogs() as warnings:
+                for name, result in benchmark_size(size, args.seed, args.repeat).items():
+                    results[f"{size}/{name}"] = result
+            if warnings:
+                raise RuntimeError(f"Handlers refused the benchmark input: {warnings[0]}")
+        finally:
+            os.chdir(home)
+            shutil.rmtree(workdir, ignore_errors=True)
+    application.quit()
+
+    if args.save_baseline:
+        baselines = {}
+        if os.path.exists(baseline_path):
+            with open(baseline_path) as baseline_file:
+                baselines = json.load(baseline_file)
+        baselines.update({name: [round(seconds, 4), round(megabytes, 1)] for name, (seconds, megabytes) in results.items()})
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(baselines, baseline_file, indent=2, sort_keys=True)
+        print(f"Saved baselines to {baseline_path}")
+        return 0
+
+    if not os.path.exists(baseline_path):
+        print(f"No baselines at {baseline_path}; run with --save-baseline to record them.")
+        return 0
+    with open(baseline_path) as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        return 1
+    print("No regressions against the baselines.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main_benchmark())
@@ -0,0 +1,104 @@
+"""Headless InvMan commands, for work that does not need the window.
+
+    python cli.py ingest-orders orders.csv
+    python cli.py restock manifest.csv
+
+Commands work on the same inventory.db and orders.journal as the app.
+"""
+import argparse
+import os
+import sys
+import time
+from storage import InventoryStore
+from journal import OrderJournal
+from sales import BatchError, plan_orders, plan_restock, read_rows
+
+DATABASE_FILE = 'inventory.db'
+ORDER_JOURNAL_FILE = 'orders.journal'
+
+
+def open_store(path):
+    if not os.path.exists(path):
+        raise SystemExit(f"No inventory database at {path}; start InvMan once to create it.")
+    return InventoryStore(path)
+
+
+def ingest_orders(args):
+    started = time.perf_counter()
+    rows = read_rows(args.file)
+    store = open_store(args.database)
+    orders = OrderJournal(args.journal)
+    try:
+        # Stock changes and order rows go in together or not at all; the orders are
+        # on disk before the stock changes commit, and replayed if those never do
+        with store.order_transaction(orders):
+            products = {product_id: product for product_id, *product in store.load_products()}
+            records, stock_rows = plan_orders(products, rows)
+            if args.dry_run:
+                print(f"{len(records)} orders are valid; nothing was written.")
+                return 0
+            store.set_stock_many(stock_rows)  # Absolute values are safe, the transaction locks the database
+            orders.extend(records)
+    except BatchError as e:
+        print(f"Rejected {args.file}, nothing was written:", file=sys.stderr)
+        for error in e.errors:
+            print(f"  {error}", file=sys.stderr)
+        return 1
+    finally:
+        orders.close()
+        store.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Ingested {len(records)} orders for {len(stock_rows)} colors in {elapsed:.2f}s "
+          f"({len(records) / elapsed if elapsed else 0:.0f} orders/s).")
+    return 0
+
+
+def restock(args):
+    rows = read_rows(args.file)
+    store = open_store(args.database)
+    try:
+        with store.transaction():
+            products = {product_id: product for product_id, *product in store.load_products()}
+            stock_rows, units, problems = plan_restock(products, rows)
+            if not args.dry_run:
+                store.add_stock_many(stock_rows)
+    finally:
+        store.close()
+
+    for problem in problems:
+        print(f"Skipped {problem}", file=sys.stderr)
+    verb = "Would add" if args.dry_run else "Added"
+    print(f"{verb} {units} units to {len(stock_rows)} colors; {len(problems)} line(s) skipped.")
+    return 1 if problems else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Headless InvMan commands.")
+    parser.add_argument('--database', default=DATABASE_FILE, help="inventory database (default: %(default)s)")
+    parser.add_argument('--journal', default=ORDER_JOURNAL_FILE, help="order journal (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest-orders', help="record a CSV/XLSX file of orders in one batch",
+                                 description="Columns: Product Name (or Product ID), Model, Color, Quantity, "
+                                             "and optionally Order Name, Shipping Fee and Date.")
+    ingest.add_argument('file')
+    ingest.add_argument('--dry-run', action='store_true', help="validate the file without writing anything")
+    ingest.set_defaults(handler=ingest_orders)
+
+    restock_command = commands.add_parser('restock', help="add the stock in a CSV/XLSX delivery manifest",
+                                          description="Columns: Product Name (or Product ID), Model, Color, Quantity. "
+                                                      "Lines naming unknown products, models or colors are reported and skipped.")
+    restock_command.add_argument('file')
+    restock_command.add_argument('--dry-run', action='store_true', help="check the manifest without writing anything")
+    restock_command.set_defaults(handler=restock)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
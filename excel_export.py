@@ -0,0 +1,64 @@
+import math
+from persistence import replace_atomically
+from tracing import tracer
+
+# openpyxl is only imported when a sheet is written, it is not needed to start the app
+REFUNDED_COLOR = "FF0000"
+
+
+def _cell_value(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    if hasattr(value, 'item') and not hasattr(value, 'to_pydatetime'):
+        return value.item()  # numpy scalars
+    return value
+
+
+def column_widths(df):
+    """Returns the auto-fit width of every column, measured on the in-memory frame."""
+    widths = []
+    for column in df.columns:
+        values = df[column].dropna().astype(str)
+        longest = int(values.str.len().max()) if len(values) else 0
+        widths.append(max(longest, len(str(column))) + 2)
+    return widths
+
+
+def write_sheet(path, df, highlight=None, fill_color=REFUNDED_COLOR):
+    """Streams a DataFrame into a formatted workbook in a single pass.
+
+    The sheet is written in openpyxl's write-only mode, so rows are never
+    held as cell objects or read back. Column widths are measured on the
+    frame up front because write-only sheets need them before the first row,
+    and rows for which ``highlight(row)`` is true are filled with
+    ``fill_color`` as they are written.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import PatternFill
+    from openpyxl.utils import get_column_letter
+
+    fill = PatternFill(start_color=fill_color, end_color=fill_color, fill_type="solid")
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    with tracer.span("column widths", columns=len(df.columns)):
+        for column_index, width in enumerate(column_widths(df), start=1):
+            sheet.column_dimensions[get_column_letter(column_index)].width = width
+
+    with tracer.span("openpyxl rows", rows=len(df)):
+        sheet.append([str(column) for column in df.columns])
+        for row in df.itertuples(index=False, name=None):
+            values = [_cell_value(value) for value in row]
+            if highlight is not None and highlight(values):
+                cells = []
+                for value in values:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.fill = fill
+                    cells.append(cell)
+                sheet.append(cells)
+            else:
+                sheet.append(values)
+
+    # A crash mid-save leaves the previous file in place
+    with tracer.span("openpyxl save", path=path), replace_atomically(path) as temp_path:
+        workbook.save(temp_path)
@@ -0,0 +1,309 @@
+import calendar
+import datetime
+import json
+import os
+import threading
+import numpy as np
+import pandas as pd
+from snapshot import read_snapshot, write_snapshot
+
+ORDER_COLUMNS = ['Order Name', 'Product Name', 'Model', 'Color', 'Quantity', 'Date', 'Unit Price', 'Model Fee', 'Shipping Fee', 'Total Price', 'Net Profit', 'Status']
+ORDER_DATE_FORMAT = '%Y-%m-%d %I:%M:%S %p'
+ORDER_DTYPES = {
+    'Quantity': 'int64',
+    'Unit Price': 'float64',
+    'Model Fee': 'float64',
+    'Shipping Fee': 'float64',
+    'Total Price': 'float64',
+    'Net Profit': 'float64',
+    'Product Name': 'category',
+    'Model': 'category',
+    'Color': 'category',
+    'Status': 'category',
+}
+CATEGORY_COLUMNS = [column for column, dtype in ORDER_DTYPES.items() if dtype == 'category']
+SNAPSHOT_TAIL_BYTES = 4096
+
+
+def _to_json(value):
+    # numpy scalars coming from pandas
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+class Journal:
+    """Append-only log with one JSON record per line.
+
+    Appends never touch existing bytes, and ``read_new`` only parses what was
+    written since the previous call, so loading stays incremental. Appends
+    reach the disk on ``sync``, which the persistence worker calls once per
+    batch; a record cut short by a crash is dropped by ``repair`` at startup.
+
+    Other processes may append to the same file. The offset therefore only
+    moves by reading; records this process appended while holding them in
+    memory are remembered by the byte range they landed in and skipped when
+    the read reaches them.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offset = 0
+        self._file = None
+        self._dirty = False
+        self._held = {}  # Start offset -> end offset of appends the caller holds in memory
+        self._lock = threading.Lock()
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def append(self, record):
+        return self.extend([record])
+
+    def extend(self, records, in_memory=False):
+        """Appends records and returns the offset of the end of the file after them.
+
+        With ``in_memory`` the caller already holds the records, and
+        ``read_new`` skips them instead of returning them again.
+        """
+        data = ''.join(json.dumps(record, default=_to_json) + '\n' for record in records).encode('utf-8')
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, 'ab')
+            self._file.write(data)
+            self._file.flush()
+            self._dirty = True
+            # Appends always land at the current end of the file, wherever other writers left it
+            end = self._file.tell()
+            if in_memory and data:
+                self._held[end - len(data)] = end
+        return end
+
+    def sync(self):
+        """Forces the records appended so far to disk."""
+        with self._lock:
+            if self._dirty:
+                os.fsync(self._file.fileno())
+                self._dirty = False
+
+    def repair(self):
+        """Cuts off a last record that a crash left half-written. Returns True if it did."""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return False
+            with open(self.path, 'rb+') as journal_file:
+                end = journal_file.seek(0, os.SEEK_END)
+                position = end
+                while position > 0:
+                    start = max(position - 65536, 0)
+                    journal_file.seek(start)
+                    newline = journal_file.read(position - start).rfind(b'\n')
+                    if newline >= 0:
+                        position = start + newline + 1
+                        break
+                    position = start
+                if position == end:
+                    return False
+                journal_file.truncate(position)
+                os.fsync(journal_file.fileno())
+            print(f"Dropped {end - position} bytes of an incomplete record from {self.path}")
+            return True
+
+    def read_new(self):
+        """Returns the records appended since the last read."""
+        if not os.path.exists(self.path):
+            return []
+
+        with self._lock:
+            if os.path.getsize(self.path) < self.offset:
+                self.offset = 0  # File was replaced, start over
+                self._held.clear()
+
+            records = []
+            held_until = 0
+            with open(self.path, 'rb') as journal_file:
+                journal_file.seek(self.offset)
+                for line in journal_file:
+                    if not line.endswith(b'\n'):
+                        break  # Incomplete write, pick it up next time
+                    held_until = self._held.pop(self.offset, held_until)
+                    held = self.offset < held_until
+                    self.offset += len(line)
+                    if line.strip() and not held:
+                        records.append(json.loads(line))
+            return records
+
+    def size(self):
+        """Returns the length of the file in bytes, 0 if it does not exist yet."""
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def read_from(self, offset):
+        """Returns the complete records from byte ``offset`` to the end, without moving the read offset."""
+        records = []
+        with self._lock, open(self.path, 'rb') as journal_file:
+            journal_file.seek(offset)
+            for line in journal_file:
+                if not line.endswith(b'\n'):
+                    break
+                if line.strip():
+                    records.append(json.loads(line))
+        return records
+
+    def holds_unread(self):
+        """Returns True if records appended with ``in_memory`` lie past the read offset."""
+        with self._lock:
+            return bool(self._held)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class OrderJournal(Journal):
+    """Order history backed by a journal and held in memory as typed columns.
+
+    Dates are int64 seconds since the epoch (of the naive local time), money
+    columns are float64, quantities int64, and the repetitive text columns are
+    categoricals. Orders recorded since the last read are kept aside and folded
+    into the columns the next time the frame is asked for.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self._frame = orders_to_frame([])
+        self._pending = []
+
+    def __len__(self):
+        return len(self._frame) + len(self._pending)
+
+    def load(self):
+        new_records = self.read_new()
+        if new_records:
+            self._pending.extend(new_records)
+            self.to_frame()
+        return new_records
+
+    def load_snapshot(self, path):
+        """Starts from the typed columns saved by ``save_snapshot``.
+
+        The snapshot stays usable while the journal has only been appended to,
+        which is checked by comparing the bytes just before the offset it
+        covered; ``load`` then only parses the lines written after it. Returns
+        False if it had to be ignored.
+        """
+        state = read_snapshot(path, [])
+        if state is None or state['tail'] is None or self._tail(state['offset']) != state['tail'].tobytes():
+            return False
+        self._frame, self._pending, self.offset = frame_from_columns(state['columns']), [], state['offset']
+        return True
+
+    def save_snapshot(self, path):
+        """Saves the typed columns; every recorded order must have been persisted.
+
+        Orders appended by other processes are read in first, so the columns
+        hold exactly the records before the saved offset. Returns False, and
+        saves nothing, if some of this process's own orders are still missing
+        from the file.
+        """
+        self.load()
+        if self.holds_unread():
+            return False
+        tail = self._tail(self.offset)
+        write_snapshot(path, [], {'offset': self.offset, 'tail': None if tail is None else np.frombuffer(tail, dtype=np.uint8),
+                                  'columns': frame_columns(self.to_frame())})
+        return True
+
+    def _tail(self, offset):
+        try:
+            with open(self.path, 'rb') as journal_file:
+                journal_file.seek(max(offset - SNAPSHOT_TAIL_BYTES, 0))
+                tail = journal_file.read(min(offset, SNAPSHOT_TAIL_BYTES))
+        except OSError:
+            return None
+        return tail if len(tail) == min(offset, SNAPSHOT_TAIL_BYTES) else None
+
+    def import_excel(self, excel_path):
+        """One-time import of a legacy orders workbook into an empty journal."""
+        if self.exists() or not os.path.exists(excel_path):
+            return False
+        legacy_df = pd.read_excel(excel_path)[ORDER_COLUMNS]
+        # Older versions saved the sheet after parsing the dates in place
+        legacy_df['Date'] = legacy_df['Date'].apply(lambda date: date.strftime(ORDER_DATE_FORMAT) if isinstance(date, datetime.datetime) else date)
+        self.extend(legacy_df.to_dict('records'))
+        return True
+
+    def record(self, order):
+        """Adds an order to the in-memory history; ``persist`` writes it out."""
+        self._pending.append(order)
+
+    def persist(self, orders):
+        self.extend(orders, in_memory=True)
+
+    def to_frame(self):
+        if self._pending:
+            pending, self._pending = self._pending, []
+            frame = pd.concat([self._frame, orders_to_frame(pending)], ignore_index=True)
+            for column in CATEGORY_COLUMNS:
+                frame[column] = frame[column].astype('category')
+            self._frame = frame
+        return self._frame
+
+    def export_frame(self):
+        """Returns a copy of the orders with dates formatted back as text."""
+        frame = self.to_frame().copy()
+        frame['Date'] = from_epoch(frame['Date']).dt.strftime(ORDER_DATE_FORMAT)
+        return frame
+
+
+def to_epoch(moment):
+    """Seconds since the epoch for a naive datetime, without any timezone shift."""
+    return calendar.timegm(moment.timetuple())
+
+
+def from_epoch(seconds):
+    return pd.to_datetime(seconds, unit='s')
+
+
+def frame_columns(frame):
+    """Returns the typed order columns as JSON values and arrays, for snapshots.
+
+    Categorical columns are stored as their categories and an array of codes,
+    numeric columns as arrays and the remaining text columns as lists.
+    """
+    columns = {}
+    for column in ORDER_COLUMNS:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            columns[column] = {'categories': values.cat.categories.tolist(), 'codes': values.cat.codes.to_numpy()}
+        elif values.dtype == object:
+            columns[column] = values.tolist()
+        else:
+            columns[column] = values.to_numpy()
+    return columns
+
+
+def frame_from_columns(columns):
+    data = {}
+    for column in ORDER_COLUMNS:
+        values = columns[column]
+        if isinstance(values, dict):
+            data[column] = pd.Categorical.from_codes(values['codes'], values['categories'])
+        else:
+            data[column] = pd.Series(values, dtype=object) if isinstance(values, list) else values
+    return pd.DataFrame(data, columns=ORDER_COLUMNS)
+
+
+def orders_to_frame(records):
+    frame = pd.DataFrame(records, columns=ORDER_COLUMNS)
+    dates = pd.to_datetime(frame['Date'], format=ORDER_DATE_FORMAT)
+    frame['Date'] = dates.values.astype('datetime64[s]').astype('int64')
+    for column, dtype in ORDER_DTYPES.items():
+        if dtype != 'category':
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').fillna(0)
+        frame[column] = frame[column].astype(dtype)
+    return frame
@@ -0,0 +1,96 @@
+import bisect
+import datetime
+import os
+import pandas as pd
+from journal import Journal
+
+TRANSACTION_COLUMNS = ['Title', 'Description', 'Date', 'Fees']
+TRANSACTION_DATE_FORMAT = '%Y-%m-%d'
+
+
+class TransactionLedger(Journal):
+    """Fee transactions loaded once and kept in memory, sorted by date.
+
+    New transactions are appended to the journal file instead of rewriting a
+    workbook. ``refresh`` compares the file's mtime and size with what was
+    last read: growth is read incrementally, anything else reloads. Range
+    totals binary-search the sorted dates and difference a prefix sum.
+    """
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.records = []
+        self.dates = []
+        self.version = 0
+        self._prefix = [0.0]
+        self._stat = None
+
+    def import_excel(self, excel_path):
+        """One-time import of a legacy Transactions.xlsx into an empty ledger."""
+        if self.exists() or not os.path.exists(excel_path):
+            return False
+        legacy_df = pd.read_excel(excel_path)
+        legacy_df['Date'] = pd.to_datetime(legacy_df['Date']).dt.strftime(TRANSACTION_DATE_FORMAT)
+        legacy_df = legacy_df.reindex(columns=TRANSACTION_COLUMNS)
+        legacy_df = legacy_df.astype(object).where(legacy_df.notna(), None)
+        self.extend(legacy_df.to_dict('records'))
+        return True
+
+    def refresh(self):
+        """Picks up records other processes added to the file since the last read. Returns True if anything changed."""
+        stat = self._file_stat()
+        if stat == self._stat:
+            return False
+        changed = False
+        if self._stat is not None and stat is not None and stat[1] < self._stat[1]:
+            self.offset = 0  # Rewritten, not appended: reload everything
+            self.records, self.dates, self._prefix = [], [], [0.0]
+            changed = True
+        for record in self.read_new():
+            self._insert(record)
+            changed = True
+        self._stat = stat
+        if changed:
+            self.version += 1
+        return changed
+
+    def record(self, transaction):
+        """Adds a transaction in memory; ``persist`` appends it to the file."""
+        self._insert(transaction)
+        self.version += 1
+
+    def persist(self, transactions):
+        self.extend(transactions, in_memory=True)
+
+    def total_fees(self, start_date, end_date):
+        """Sum of fees for the inclusive date range."""
+        if len(self._prefix) != len(self.records) + 1:
+            self._rebuild_prefix()
+        low = bisect.bisect_left(self.dates, start_date.toordinal())
+        high = bisect.bisect_right(self.dates, end_date.toordinal())
+        return self._prefix[high] - self._prefix[low] if high > low else 0.0
+
+    def to_frame(self):
+        return pd.DataFrame(self.records, columns=TRANSACTION_COLUMNS)
+
+    def _insert(self, transaction):
+        day = datetime.datetime.strptime(str(transaction['Date'])[:10], TRANSACTION_DATE_FORMAT).toordinal()
+        position = bisect.bisect_right(self.dates, day)
+        self.dates.insert(position, day)
+        self.records.insert(position, transaction)
+        if position == len(self.records) - 1 and len(self._prefix) == len(self.records):
+            self._prefix.append(self._prefix[-1] + float(transaction['Fees'] or 0.0))
+        else:
+            del self._prefix[1:]  # Inserted out of order, rebuild on the next query
+
+    def _rebuild_prefix(self):
+        self._prefix = [0.0]
+        for transaction in self.records:
+            self._prefix.append(self._prefix[-1] + float(transaction['Fees'] or 0.0))
+
+    def _file_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
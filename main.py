@@ -1,19 +1,38 @@
 import sys
 import os
 import datetime
+import threading
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QLabel, QPushButton, QLineEdit,
-    QWidget, QFileDialog, QMessageBox, QScrollArea, QGridLayout, QDialog, QHBoxLayout, QComboBox, QDateEdit, QSizePolicy
+    QWidget, QFileDialog, QMessageBox, QScrollArea, QGridLayout, QDialog, QHBoxLayout, QComboBox, QDateEdit, QSizePolicy,
+    QListView, QTreeView, QHeaderView
 )
-from PyQt5.QtGui import QPixmap, QFont, QIcon
-from PyQt5.QtCore import Qt, QDate
+from PyQt5.QtGui import QFont, QIcon
+from PyQt5.QtCore import Qt, QDate, QTimer, pyqtSignal
 import pandas as pd
-import openpyxl
-from openpyxl.styles import PatternFill
 import shutil
-import re
+from functools import partial
+from storage import ConflictError, InventoryStore, migrate_from_excel
+from journal import OrderJournal, ORDER_DATE_FORMAT
+from views import ProductListModel, ProductCardDelegate, ProductDetailsModel, ProductIdRole, CARD_SIZE, IMAGE_SIZE, visible_rows
+from thumbnails import ThumbnailCache, ThumbnailLoader
+from search_index import NameIndex, ModelIndex
+from persistence import PersistenceWorker
+from excel_export import write_sheet
+from rollups import DailyRollup, DailySales, order_rollup_rows, order_rollup_values, order_sales_rows, period_net_profit, transaction_rollup_rows
+from ledger import TransactionLedger
+from rankings import SalesRanking
+from snapshot import read_snapshot, write_snapshot
+from tracing import milliseconds_from_env, tracer, traced
+from stall_watchdog import StallWatchdog, StallDiagnosticsDialog
+from sales import apply_edit, apply_sale, apply_refund, unchanged_models, order_record, refund_record, normalize_model_name, plan_restock, read_rows
+
+# Best/worst seller periods, in days; None means lifetime counters
+SELLERS_PERIODS = {"All time": None, "Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90}
 
 class InventoryApp(QMainWindow):
+    persistence_failed = pyqtSignal(str, str)
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("InvMan")
@@ -22,20 +41,56 @@ class InventoryApp(QMainWindow):
         self.showMaximized()
 
         # Define the structure of the inventory
-        self.inventory_file = 'inventory.xlsx'
-        self.order_file = 'orders.xlsx'
+        self.database_file = 'inventory.db'
+        self.inventory_file = 'inventory.xlsx'  # Legacy workbook, now an export
+        self.order_file = 'orders.xlsx'  # Export of the order journal
+        self.order_journal_file = 'orders.journal'
+        self.transactions_file = 'Transactions.xlsx'  # Export of the transactions ledger
+        self.transactions_journal_file = 'transactions.journal'
         self.performance_file = 'performance.xlsx'  # New file for performance checks
-
+        self.snapshot_file = 'inventory.snapshot'  # Catalog and search indexes, checked against the database
+        self.orders_snapshot_file = 'orders.snapshot'
+        self.slow_action_log_file = 'slow_actions.log'  # Rotated, with the step breakdown of every slow action
+        self.stall_log_file = 'stalls.log'  # Rotated, with the GUI thread's stack during every event-loop stall
+        self.thumbnail_cache = ThumbnailCache('thumbnails', IMAGE_SIZE)
+        self.thumbnail_loader = ThumbnailLoader(self.thumbnail_cache, self)
+
+        # Tracing is off unless INVMAN_TRACE is set; INVMAN_SLOW_ACTION_MS sets what counts as slow
+        tracer.configure(self.slow_action_log_file, threshold_ms=milliseconds_from_env('INVMAN_SLOW_ACTION_MS', 500),
+                         enabled=bool(os.environ.get('INVMAN_TRACE')))
+
+        # All disk writes go through one background thread, failures come back as a signal
+        self.persistence_failed.connect(self.show_persistence_error)
+        # Queued writes that pile up are committed as one batch: one transaction and one fsync per journal
+        self.persistence = PersistenceWorker(on_error=lambda description, e: self.persistence_failed.emit(description, str(e)),
+                                             transaction=lambda: self.store.transaction())
+        self.persistence.start()
+        # With INVMAN_SHARED_STORE set, several tills can share the database: edits and restocks are
+        # committed before the dialog closes, and edits fail if another till got there first
+        self.shared_store = bool(os.environ.get('INVMAN_SHARED_STORE'))
+        self.order_loader = threading.Thread(target=self.load_order_history, name="OrderLoader", daemon=True)
 
         # Predefined categories
         self.categories = ["Cases", "Screen Protectors", "Chargers", "Headphones", "Speakers", "Cables", "Power Banks", "Mounts", "Stands", "Other"]
 
+        # Measures event-loop delay from a heartbeat; INVMAN_STALL_MS sets what counts as a stall.
+        # Started before loading so a slow start shows up as a stall too
+        self.watchdog = StallWatchdog(threshold_ms=milliseconds_from_env('INVMAN_STALL_MS', 500),
+                                      log_path=self.stall_log_file, parent=self)
+        self.watchdog.start()
+
         # Create UI Elements
         self.initUI()
 
         # Load inventory data
         self.load_inventory()
 
+        # Products changed by other tills or the command line are reloaded one by one
+        self.change_timer = QTimer(self)
+        self.change_timer.setInterval(1000)
+        self.change_timer.timeout.connect(self.apply_external_changes)
+        self.change_timer.start()
+
     from PyQt5.QtWidgets import QSizePolicy
 
     def initUI(self):
@@ -125,6 +180,14 @@ class InventoryApp(QMainWindow):
             font-family: Helvetica;
             letter-spacing: 0.8rem;
             }
+            QPushButton#restockButton {
+            background-color: #8a5a00;
+            color: white;
+            font-weight: bold;
+            text-transform: uppercase;
+            font-family: Helvetica;
+            letter-spacing: 0.8rem;
+        }
             QPushButton#bestWorstButton {
             background-color: #7d0101;
             color: white;
@@ -132,6 +195,22 @@ class InventoryApp(QMainWindow):
             text-transform: uppercase;
             font-family: Helvetica;
             letter-spacing: 0.8rem;
+        }
+            QPushButton#diagnosticsButton {
+            background-color: #555555;
+            color: white;
+            font-weight: bold;
+            text-transform: uppercase;
+            font-family: Helvetica;
+            letter-spacing: 0.8rem;
+        }
+            QPushButton#exportButton {
+            background-color: #1d6f42;
+            color: white;
+            font-weight: bold;
+            text-transform: uppercase;
+            font-family: Helvetica;
+            letter-spacing: 0.8rem;
         }
         """)
 
@@ -164,13 +243,29 @@ class InventoryApp(QMainWindow):
         self.category_filter.currentIndexChanged.connect(self.apply_filters)
         layout.addWidget(self.category_filter)
 
-        self.scroll_area = QScrollArea(self)
-        self.scroll_area_widget_contents = QWidget()
-        self.scroll_area.setWidget(self.scroll_area_widget_contents)
-        self.scroll_area.setWidgetResizable(True)
-        self.scroll_area.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
-        self.inventory_layout = QGridLayout(self.scroll_area_widget_contents)
-        layout.addWidget(self.scroll_area)
+        # Only the visible cards are painted, filtering just swaps the model rows
+        self.product_model = ProductListModel(self)
+        self.inventory_view = QListView(self)
+        self.inventory_view.setViewMode(QListView.IconMode)
+        self.inventory_view.setResizeMode(QListView.Adjust)
+        self.inventory_view.setMovement(QListView.Static)
+        self.inventory_view.setUniformItemSizes(True)
+        self.inventory_view.setGridSize(CARD_SIZE)
+        self.inventory_view.setMouseTracking(True)
+        self.inventory_view.setItemDelegate(ProductCardDelegate(self.thumbnail_loader, self.inventory_view))
+        self.inventory_view.setModel(self.product_model)
+        self.inventory_view.clicked.connect(lambda model_index: self.show_product_options(model_index.data(ProductIdRole)))
+        self.inventory_view.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        layout.addWidget(self.inventory_view)
+
+        # Images are decoded off the GUI thread; cards show a placeholder until they arrive
+        self.thumbnail_loader.thumbnail_ready.connect(lambda _: self.inventory_view.viewport().update())
+        self.visible_images_timer = QTimer(self)
+        self.visible_images_timer.setSingleShot(True)
+        self.visible_images_timer.setInterval(50)
+        self.visible_images_timer.timeout.connect(self.cancel_hidden_thumbnails)
+        self.inventory_view.verticalScrollBar().valueChanged.connect(self.visible_images_timer.start)
+        self.product_model.modelReset.connect(self.visible_images_timer.start)
 
         button_layout = QHBoxLayout()
         add_button = QPushButton("Add Item", self)
@@ -191,12 +286,30 @@ class InventoryApp(QMainWindow):
         track_performance_button.clicked.connect(self.open_performance_window)
         button_layout.addWidget(track_performance_button)
 
+        restock_button = QPushButton("Restock from File", self)
+        restock_button.setObjectName("restockButton")
+        restock_button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        restock_button.clicked.connect(self.restock_from_file)
+        button_layout.addWidget(restock_button)
+
         best_worst_sellers_button = QPushButton("Best/Worst Sellers", self)
         best_worst_sellers_button.setObjectName("bestWorstButton")
         best_worst_sellers_button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
         best_worst_sellers_button.clicked.connect(self.view_best_worst_sellers)
         button_layout.addWidget(best_worst_sellers_button)
 
+        export_button = QPushButton("Export to Excel", self)
+        export_button.setObjectName("exportButton")
+        export_button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        export_button.clicked.connect(self.export_to_excel)
+        button_layout.addWidget(export_button)
+
+        diagnostics_button = QPushButton("Diagnostics", self)
+        diagnostics_button.setObjectName("diagnosticsButton")
+        diagnostics_button.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+        diagnostics_button.clicked.connect(self.view_diagnostics)
+        button_layout.addWidget(diagnostics_button)
+
         layout.addLayout(button_layout)
 
         container = QWidget()
@@ -236,118 +349,394 @@ class InventoryApp(QMainWindow):
         if not os.path.exists("images"):
             os.makedirs("images")
 
+    @traced()
     def load_inventory(self):
         try:
-            if os.path.exists(self.inventory_file):
-                self.inventory_df = pd.read_excel(self.inventory_file)
-                self.inventory_df['Data'] = self.inventory_df['Data'].apply(eval)  # Convert string representation of dict back to dict
-                
-                # Normalize model names and colors
-                self.normalize_model_names_in_inventory()
+            self.store = InventoryStore(self.database_file)
+
+            # Import the legacy workbook the first time the database is created
+            if migrate_from_excel(self.store, self.inventory_file, self.normalize_product_data):
+                print(f"Migrated {self.inventory_file} into {self.database_file}")
+
+            # Orders journaled by a till that crashed before committing their stock changes
+            self.orders = OrderJournal(self.order_journal_file)
+            self.store.replay_orders(self.orders)
+
+            # Changes from here on are picked up by apply_external_changes
+            self.change_cursor = self.store.last_change()
+            self.seen_data_version = self.store.data_version()
+
+            # The snapshot from the last clean exit is only used if the database is unchanged since
+            self.name_index = NameIndex()
+            self.model_index = ModelIndex()
+            with tracer.span("read snapshot"):
+                snapshot = read_snapshot(self.snapshot_file, self.snapshot_sources())
+            if snapshot is not None:
+                products = snapshot['products']
+                self.name_index.restore(snapshot['name_index'])
+                self.model_index.restore(snapshot['model_index'])
             else:
-                self.inventory_df = pd.DataFrame(columns=['Item Name', 'Category', 'Data', 'Image Path'])
-            
-            self.load_orders()
+                products = self.store.load_products()
+                with tracer.span("build search indexes", rows=len(products)):
+                    self.name_index.build((product[0], product[1]) for product in products)
+                    self.model_index.build((product[0], product[3]) for product in products)
+
+            with tracer.span("build frame", rows=len(products)):
+                self.inventory_df = pd.DataFrame(
+                    [product[1:] for product in products],
+                    columns=['Item Name', 'Category', 'Data', 'Image Path'],
+                    index=pd.Index([product[0] for product in products], name='Product ID')
+                )
+            with tracer.span("build sales ranking"):
+                self.sales_ranking = SalesRanking()
+                self.sales_ranking.build(zip(self.inventory_df.index.tolist(), self.inventory_df['Data']))
+            self.product_versions = self.store.versions() if self.shared_store else {}
+
             self.populate_phone_model_dropdown()
             self.update_inventory_view()
-            
+
+            # Order history is only needed by orders, refunds and reports, so it loads after the grid is up
+            self.order_loader.start()
         except Exception as e:
             print(f"Error loading inventory: {e}")
 
-    def normalize_model_names_in_inventory(self):
+    def snapshot_sources(self):
+        return [self.database_file, self.database_file + '-wal']
+
+    @traced()
+    def save_snapshots(self):
+        """Saves the catalog and order columns for the next start, once every write has landed."""
+        if self.persistence.failures:
+            return  # Memory and disk may disagree, let the next start read the database
         try:
-            for index, row in self.inventory_df.iterrows():
-                normalized_data = {}
-                for model, model_data in row['Data'].items():
-                    normalized_model = self.normalize_model_name(model)
-                    normalized_model_data = {
-                        'Price': model_data.get('Price', 0.0),
-                        'Fee': model_data.get('Fee', 0.0),
-                        'Colors': {color.strip(): stock for color, stock in model_data.get('Colors', {}).items()}
-                    }
-                    normalized_data[normalized_model] = normalized_model_data
-                self.inventory_df.at[index, 'Data'] = normalized_data
+            self.store.close()
+            products = list(zip(self.inventory_df.index.tolist(), self.inventory_df['Item Name'].tolist(), self.inventory_df['Category'].tolist(),
+                                self.inventory_df['Data'].tolist(), self.inventory_df['Image Path'].tolist()))
+            write_snapshot(self.snapshot_file, self.snapshot_sources(), {
+                'products': products,
+                'name_index': self.name_index.state(),
+                'model_index': self.model_index.state(),
+            })
+            self.wait_for_orders()
+            self.orders.save_snapshot(self.orders_snapshot_file)
         except Exception as e:
-            print(f"Error normalizing model names in inventory: {e}")
+            print(f"Error saving snapshots: {e}")
+
+    @traced()
+    def load_order_history(self):
+        """Runs on the order loader thread; nothing here may touch widgets."""
+        self.load_orders()
+        self.load_transactions()
+        self.build_daily_rollup()
+        self.build_daily_sales()
+
+    @traced()
+    def wait_for_orders(self):
+        """Blocks until the order history has loaded; only waits during the first moments after start."""
+        if self.order_loader.is_alive():
+            self.order_loader.join()
+
+    def normalize_product_data(self, data):
+        normalized_data = {}
+        for model, model_data in data.items():
+            normalized_model = self.normalize_model_name(model)
+            normalized_model_data = {
+                'Price': model_data.get('Price', 0.0),
+                'Fee': model_data.get('Fee', 0.0),
+                'Colors': {color.strip(): stock for color, stock in model_data.get('Colors', {}).items()}
+            }
+            if 'Units Sold' in model_data:
+                normalized_model_data['Units Sold'] = model_data['Units Sold']
+            if 'Units Sold Colors' in model_data:
+                normalized_model_data['Units Sold Colors'] = {color.strip(): units for color, units in model_data['Units Sold Colors'].items()}
+            normalized_data[normalized_model] = normalized_model_data
+        return normalized_data
 
     def normalize_model_name(self, model_name):
-        # Use regex to clean up model name: remove leading/trailing spaces and normalize internal spaces
-        normalized_model = re.sub(r'\s+', ' ', model_name.strip())
-        return normalized_model
-
-    def save_inventory(self):
+        return normalize_model_name(model_name)
+
+    @traced()
+    def closeEvent(self, event):
+        self.watchdog.stop()
+        self.change_timer.stop()
+        # Make sure every queued write reaches the disk before exiting
+        self.persistence.close()
+        self.save_snapshots()
+        super().closeEvent(event)
+
+    def show_persistence_error(self, description, error):
+        QMessageBox.warning(self, "Error", f"Failed to save ({description}): {error}")
+
+    @traced()
+    def save_product(self, index, item_name, category, image_path, models, expected_version=None):
+        """Writes an edit of a product and its models (see InventoryStore.edit_product).
+
+        Stock is written as the change from what the form showed. With the
+        shared store the edit is refused if another till changed the product
+        since ``expected_version``, read when the form was opened; returns
+        False if it was.
+        """
         try:
-            self.inventory_df['Data'] = self.inventory_df['Data'].apply(str)  # Convert dict to string representation
-            self.inventory_df.to_excel(self.inventory_file, index=False)
-            self.inventory_df['Data'] = self.inventory_df['Data'].apply(eval)  # Convert back to dict for in-memory operations
+            if self.shared_store:
+                try:
+                    self.store.edit_product(index, item_name, category, image_path, models, expected_version)
+                finally:
+                    # Either way memory ends up as the database has it, with the new version
+                    self.refresh_products({index})
+                return True
+            self.inventory_df.at[index, 'Item Name'] = item_name
+            self.name_index.update(index, item_name)
+            self.inventory_df.at[index, 'Category'] = category
+            self.inventory_df.at[index, 'Image Path'] = image_path
+            data = self.inventory_df.at[index, 'Data']
+            apply_edit(data, models)
+            # Not coalesced by product: each edit moves stock by its own difference
+            self.persistence.submit(partial(self.store.edit_product, index, item_name, category, image_path, models),
+                                    description="product update")
+            self.model_index.set_models(index, data.keys())
+            self.sales_ranking.set_product(index, data)
+            self.populate_phone_model_dropdown()
             self.update_inventory_view()
+            return True
+        except ConflictError:
+            return False
+        except Exception as e:
+            print(f"Error saving product: {e}")
+            return False
+
+    def sell_stock(self, index, model, color, quantity, order):
+        """Takes sold units off one color and records the order. Returns False if the stock was sold elsewhere first."""
+        return self.write_order(index, model, color, partial(self.store.sell, index, model, color, quantity),
+                                partial(apply_sale, color=color, quantity=quantity), order)
+
+    def return_stock(self, index, model, color, quantity, order):
+        """Puts refunded units back in stock and records the refund."""
+        self.write_order(index, model, color, partial(self.store.refund, index, model, color, quantity),
+                         partial(apply_refund, color=color, quantity=quantity), order)
+
+    def add_stock(self, rows):
+        """Writes (product id, model, color, quantity) increments that were already added in memory."""
+        if not self.shared_store:
+            self.persistence.submit(partial(self.store.add_stock_many, rows), description="stock update")
+            return
+        try:
+            self.store.add_stock_many(rows)
+        finally:
+            self.refresh_products({product_id for product_id, _, _, _ in rows})
+
+    def write_order(self, index, model, color, write, apply, order):
+        """Runs a conditional stock write and journals its order in one transaction, then updates memory.
+
+        Sales and refunds are committed before the receipt is shown, with or
+        without the shared store, since the command line and the service may
+        sell the same stock. The order is fsynced before the stock change
+        commits. With the shared store the product is reloaded; otherwise
+        ``apply`` makes the same change to its model's Data dict. Returns
+        False if the write raised ConflictError.
+        """
+        self.wait_for_orders()
+        try:
+            with self.store.order_transaction(self.orders):
+                write()
+                self.orders.extend([order])
+        except ConflictError:
+            if not self.shared_store:
+                self.persistence.flush()  # Queued edits land first, or reloading would undo them in memory
+            self.refresh_products({index})
+            return False
+        finally:
+            self.sync_orders()
+
+        if self.shared_store:
+            self.refresh_products({index})
+            return True
+        model_data = self.inventory_df.at[index, 'Data'][model]
+        apply(model_data)
+        if color in model_data.get('Units Sold Colors', {}):
+            self.sales_ranking.set(index, model, color, model_data['Units Sold Colors'][color])
+        return True
+
+    @traced()
+    def refresh_products(self, product_ids):
+        """Reloads products from the database into memory, the indexes and, if they show there, the grid."""
+        with self.store.reading():
+            products = self.store.load_products(product_ids)
+            versions = self.store.versions(product_ids)
+        grid_changed = False
+        loaded = set()
+        for product_id, item_name, category, data, image_path in products:
+            loaded.add(product_id)
+            if product_id in self.inventory_df.index:
+                grid_changed |= ((self.inventory_df.at[product_id, 'Item Name'], self.inventory_df.at[product_id, 'Category'],
+                                  self.inventory_df.at[product_id, 'Image Path']) != (item_name, category, image_path))
+                self.inventory_df.at[product_id, 'Item Name'] = item_name
+                self.inventory_df.at[product_id, 'Category'] = category
+                self.inventory_df.at[product_id, 'Image Path'] = image_path
+                # In place, so open dialogs keep showing the current data
+                current_data = self.inventory_df.at[product_id, 'Data']
+                current_data.clear()
+                current_data.update(data)
+                self.name_index.update(product_id, item_name)
+            else:
+                self.inventory_df.loc[product_id] = [item_name, category, data, image_path]
+                self.name_index.add(product_id, item_name)
+                grid_changed = True
+            self.model_index.set_models(product_id, data.keys())
+            self.sales_ranking.set_product(product_id, data)
+
+        for product_id in set(product_ids) - loaded:
+            if product_id in self.inventory_df.index:
+                self.inventory_df.drop(product_id, inplace=True)
+                self.name_index.remove(product_id)
+                self.model_index.remove(product_id)
+                self.sales_ranking.remove_product(product_id)
+                grid_changed = True
+            self.product_versions.pop(product_id, None)
+        if self.shared_store:
+            self.product_versions.update(versions)
+
+        self.populate_phone_model_dropdown()
+        if grid_changed:
+            self.apply_filters()
+
+    def apply_external_changes(self):
+        """Runs every second and reloads what other tills and the command line changed."""
+        try:
+            if self.order_loader.is_alive() or self.persistence.pending():
+                return  # This till's own writes land first, or reloading would undo them in memory
+            data_version = self.store.data_version()
+            if data_version != self.seen_data_version:
+                self.seen_data_version = data_version
+                self.change_cursor, product_ids = self.store.changes_since(self.change_cursor)
+                if product_ids is None:
+                    # Missed changes were pruned, compare everything
+                    product_ids = set(self.inventory_df.index.tolist()) | set(self.store.versions())
+                if product_ids:
+                    self.refresh_products(product_ids)
+            # Orders and fees appended by other tills, the command line or the service
+            self.sync_orders()
+            if self.transactions.refresh():
+                self.build_daily_rollup()
+        except Exception as e:
+            print(f"Error applying external changes: {e}")
+
+    def export_inventory(self):
+        try:
+            self.persistence.submit(partial(self.store.export_excel, self.inventory_file),
+                                    key=('export', self.inventory_file), description="inventory export", transactional=False)
         except Exception as e:
-            print(f"Error saving inventory: {e}")
+            print(f"Error exporting inventory: {e}")
+
+    @traced()
+    def export_transactions(self):
+        try:
+            self.wait_for_orders()
+            self.persistence.submit(partial(write_sheet, self.transactions_file, self.transactions.to_frame()),
+                                    key=('export', self.transactions_file), description="transactions export", transactional=False)
+        except Exception as e:
+            print(f"Error exporting transactions: {e}")
+
+    def export_to_excel(self):
+        self.export_inventory()
+        self.export_orders()
+        self.export_transactions()
+        QMessageBox.information(self, "Export", f"Exporting inventory to {self.inventory_file}, orders to {self.order_file} and transactions to {self.transactions_file}.")
 
+    @property
+    def orders_df(self):
+        self.wait_for_orders()
+        return self.orders.to_frame()
+
+    @traced()
     def load_orders(self):
         try:
-            if os.path.exists(self.order_file):
-                self.orders_df = pd.read_excel(self.order_file)
-                self.orders_df = self.orders_df[['Order Name','Product Name', 'Model', 'Color', 'Quantity', 'Date', 'Unit Price', 'Model Fee', 'Shipping Fee', 'Total Price', 'Net Profit', 'Status']]
-            else:
-                self.orders_df = pd.DataFrame(columns=['Order Name','Product Name', 'Model', 'Color', 'Quantity', 'Date', 'Unit Price', 'Model Fee', 'Shipping Fee', 'Total Price', 'Net Profit', 'Status'])
+            # Import the legacy workbook the first time the journal is created
+            if self.orders.import_excel(self.order_file):
+                print(f"Migrated {self.order_file} into {self.order_journal_file}")
+
+            # Recover from a crash in the middle of an append, then only parse the
+            # orders appended since the last snapshot
+            self.orders.repair()
+            self.orders.load_snapshot(self.orders_snapshot_file)
+            self.orders.load()
+            self.persistence.register_sync(self.orders.sync)
         except Exception as e:
             print(f"Error loading orders: {e}")
-            
-    def save_orders(self):
+
+    @traced()
+    def load_transactions(self):
+        try:
+            self.transactions = TransactionLedger(self.transactions_journal_file)
+
+            # Import the legacy workbook the first time the ledger is created
+            if self.transactions.import_excel(self.transactions_file):
+                print(f"Migrated {self.transactions_file} into {self.transactions_journal_file}")
+
+            self.transactions.repair()
+            self.transactions.refresh()
+            self.persistence.register_sync(self.transactions.sync)
+        except Exception as e:
+            print(f"Error loading transactions: {e}")
+
+    @traced()
+    def build_daily_rollup(self):
+        self.daily_rollup = DailyRollup()
+        self.daily_rollup.build(order_rollup_rows(self.orders.to_frame()) + transaction_rollup_rows(self.transactions))
+
+    @traced()
+    def build_daily_sales(self):
+        self.daily_sales = DailySales()
+        self.daily_sales.build(order_sales_rows(self.orders.to_frame()))
+
+    def add_to_daily_totals(self, order):
+        order_day = datetime.datetime.strptime(order['Date'], ORDER_DATE_FORMAT).date()
+        self.daily_rollup.add(order_day, order_rollup_values(order))
+        self.daily_sales.add(order_day, (order['Product Name'], order['Model'], order['Color']), order['Quantity'])
+
+    def sync_orders(self):
+        """Folds orders appended to the journal since the last read into the history.
+
+        This till's own orders are read back after they commit, the same way
+        as orders from other tills, the command line and the service.
+        """
+        for order in self.orders.load():
+            self.add_to_daily_totals(order)
+
+    @traced()
+    def export_orders(self):
         try:
-            self.orders_df.to_excel(self.order_file, index=False)
-            self.format_orders_sheet()
+            self.wait_for_orders()
+            orders_df = self.orders.export_frame()
+            self.persistence.submit(partial(self.write_orders_file, orders_df),
+                                    key=('export', self.order_file), description="orders export", transactional=False)
         except Exception as e:
-            print(f"Error saving orders: {e}")
+            print(f"Error exporting orders: {e}")
+
+    def write_orders_file(self, orders_df):
+        # Highlight "REFUND" rows while writing
+        write_sheet(self.order_file, orders_df, highlight=lambda row: row[-1] == "REFUNDED")
 
+    @traced()
     def update_inventory_view(self):
         try:
-            for i in reversed(range(self.inventory_layout.count())):
-                widget_to_remove = self.inventory_layout.itemAt(i).widget()
-                self.inventory_layout.removeWidget(widget_to_remove)
-                widget_to_remove.setParent(None)
-            for index, row in self.inventory_df.iterrows():
-                self.display_product(row, index)
+            self.display_filtered_inventory(self.inventory_df)
         except Exception as e:
             print(f"Error updating inventory view: {e}")
 
-    def display_product(self, row, index):
+    def cancel_hidden_thumbnails(self):
         try:
-            item_name = row['Item Name']
-            category = row['Category']
-            image_path = row['Image Path']
-
-            # Product container
-            product_container = QWidget()
-            product_layout = QVBoxLayout()
-
-            # Product image
-            if isinstance(image_path, str) and os.path.exists(image_path):
-                pixmap = QPixmap(image_path)
-                pixmap = pixmap.scaled(150, 150, Qt.KeepAspectRatio, Qt.SmoothTransformation)  # Adjust size as needed
-            else:
-                pixmap = QPixmap(150, 150)  # Adjust size as needed
-
-            image_label = QLabel(self)
-            image_label.setPixmap(pixmap)
-            image_label.mousePressEvent = lambda event, idx=index: self.show_product_options(idx)
-            product_layout.addWidget(image_label)
-
-            # Product details with larger font and bold name
-            details = QLabel(f"<b>Name: {item_name}</b><br>Category: {category}", self)
-            details.setStyleSheet("font-size: 18px; margin-top: 10px;")  # Adjust font size and margin as needed
-            product_layout.addWidget(details)
-
-            product_container.setLayout(product_layout)
-            self.inventory_layout.addWidget(product_container, index // 3, index % 3)
+            rows = self.product_model.rows
+            self.thumbnail_loader.retain([rows[row][3] for row in visible_rows(self.inventory_view)])
         except Exception as e:
-            print(f"Error displaying product: {e}")
+            print(f"Error cancelling hidden thumbnails: {e}")
+
+    def product_rows(self, df):
+        return list(zip(df.index.tolist(), df['Item Name'], df['Category'], df['Image Path']))
 
 
     def show_product_options(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
             self.options_window = QDialog(self)
             self.options_window.setWindowTitle(f"Options for {product['Item Name']}")
             self.options_window.setGeometry(200, 200, 400, 400)
@@ -393,7 +782,7 @@ class InventoryApp(QMainWindow):
 
     def view_details(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
             details_window = QDialog(self)
             details_window.setWindowTitle(f"Details for {product['Item Name']}")
             details_window.setGeometry(300, 300, 500, 300)
@@ -453,7 +842,7 @@ class InventoryApp(QMainWindow):
 
     def refund_product(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
             self.refund_window = QDialog(self)
             self.refund_window.setWindowTitle(f"Refund {product['Item Name']}")
             self.refund_window.setGeometry(200, 200, 400, 400)
@@ -497,7 +886,7 @@ class InventoryApp(QMainWindow):
 
     def process_refund(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
             refund_quantity = self.refund_quantity_entry.text()
             selected_model = self.refund_model_combobox.currentText()
             selected_color = self.refund_colors_combobox.currentText()
@@ -505,24 +894,17 @@ class InventoryApp(QMainWindow):
 
             if refund_quantity.isdigit() and int(refund_quantity) > 0:
                 refund_quantity = int(refund_quantity)
-                unit_price = product['Data'][selected_model]['Price']
-                model_fee = product['Data'][selected_model].get('Fee', 0)
+                model_data = product['Data'][selected_model]
 
                 if refund_shipping_fee.isdigit() and int(refund_shipping_fee) >= 0:
                     refund_shipping_fee = int(refund_shipping_fee)
-                    total_price_without_shipping = unit_price * refund_quantity
-                    total_price = refund_shipping_fee
-                    net_profit = (unit_price - model_fee) * refund_quantity
-
-                    # Update stock without checking if it is sufficient
-                    product['Data'][selected_model]['Colors'][selected_color] += refund_quantity
-                    self.save_inventory()
 
-                    # Update the order sheet to mark it as refunded
-                    order_name = f"Refund-{product['Item Name']}-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
-                    new_order = pd.DataFrame([[order_name, product['Item Name'], selected_model, selected_color, -refund_quantity, datetime.datetime.now().strftime('%Y-%m-%d %I:%M:%S %p'), unit_price, model_fee, refund_shipping_fee, total_price, -net_profit, 'REFUNDED']], columns=['Order Name', 'Product Name', 'Model', 'Color', 'Quantity', 'Date', 'Unit Price', 'Model Fee', 'Shipping Fee', 'Total Price', 'Net Profit', 'Status'])
-                    self.orders_df = pd.concat([self.orders_df, new_order], ignore_index=True)
-                    self.save_orders()
+                    with tracer.span("process_refund", quantity=refund_quantity):
+                        # Update stock without checking if it is sufficient, take the refunded
+                        # units back off the sales counters and mark the order as refunded
+                        self.return_stock(index, selected_model, selected_color, refund_quantity,
+                                          refund_record(product['Item Name'], selected_model, model_data, selected_color,
+                                                        refund_quantity, refund_shipping_fee, datetime.datetime.now(), index))
 
                     QMessageBox.information(self, "Success", "Refund processed successfully.")
                     self.refund_window.close()
@@ -700,12 +1082,12 @@ class InventoryApp(QMainWindow):
                 for index, product in self.inventory_df.iterrows():
                     for model, model_data in product['Data'].items():
                         if model == fields[0].text():  # Assuming the first entry is the model name
-                            del self.inventory_df.at[index, 'Data'][model]
+                            models = [edit for edit in unchanged_models(product['Data']) if edit[0] != model]
+                            self.save_product(index, product['Item Name'], product['Category'], product['Image Path'], models,
+                                              self.product_versions.get(index))
                             print(f"Removed existing model: {model}")
+                            print(f"Updated product data: {self.inventory_df.at[index, 'Data']}")
                             break
-
-                print(f"Updated product data: {self.inventory_df.at[index, 'Data']}")
-                self.save_inventory()
         except Exception as e:
             print(f"Error removing model fields: {e}")
 
@@ -774,10 +1156,14 @@ class InventoryApp(QMainWindow):
                     break
 
             if valid and item_name and category and data and os.path.exists(image_path):
-                new_item = pd.DataFrame([[item_name, category, data, image_path]], columns=['Item Name', 'Category', 'Data', 'Image Path'])
-                self.inventory_df = pd.concat([self.inventory_df, new_item], ignore_index=True)
-
-                self.save_inventory()
+                with tracer.span("add_item", models=len(data)):
+                    product_id = self.store.add_product(item_name, category, data, image_path)
+                    self.inventory_df.loc[product_id] = [item_name, category, data, image_path]
+                    self.name_index.add(product_id, item_name)
+                    self.model_index.set_models(product_id, data.keys())
+                    self.populate_phone_model_dropdown()
+
+                    self.update_inventory_view()
                 QMessageBox.information(self, "Success", f"Added {item_name} to inventory.")
                 self.add_window.close()
             else:
@@ -789,7 +1175,7 @@ class InventoryApp(QMainWindow):
 
     def add_to_count(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
             self.add_stock_window = QDialog(self)
             self.add_stock_window.setWindowTitle("Add Stock")
             self.add_stock_window.setGeometry(200, 200, 400, 400)
@@ -841,13 +1227,13 @@ class InventoryApp(QMainWindow):
 
     def confirm_add_stock(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            increments = []
             for (model, color), stock_entry in self.add_stock_entries.items():
                 stock = stock_entry.text()
                 if stock.isdigit():
                     stock_quantity = int(stock)
                     if stock_quantity >= 0:
-                        self.inventory_df.at[index, 'Data'][model]['Colors'][color] += stock_quantity
+                        increments.append((model, color, stock_quantity))
                     else:
                         QMessageBox.warning(self, "Error", "Please enter a non-negative stock quantity for the selected model and color.")
                         return
@@ -855,15 +1241,50 @@ class InventoryApp(QMainWindow):
                     QMessageBox.warning(self, "Error", "Please enter a valid stock quantity for the selected model and color.")
                     return
 
-            self.save_inventory()
+            with tracer.span("confirm_add_stock", colors=len(increments)):
+                data = self.inventory_df.at[index, 'Data']
+                for model, color, stock_quantity in increments:
+                    data[model]['Colors'][color] += stock_quantity
+                self.add_stock([(index, model, color, stock_quantity) for model, color, stock_quantity in increments])
             self.add_stock_window.close()
             QMessageBox.information(self, "Success", "Stock updated successfully.")
         except Exception as e:
             print(f"Error confirming add stock: {e}")
 
+    def restock_from_file(self):
+        try:
+            manifest_path, _ = QFileDialog.getOpenFileName(self, "Select Delivery Manifest", "", "Manifests (*.csv *.xlsx)")
+            if not manifest_path:
+                return
+
+            with tracer.span("restock_from_file") as span:
+                with tracer.span("read manifest") as read_span:
+                    rows = read_rows(manifest_path)
+                    read_span.set(rows=len(rows))
+                products = {product_id: (product['Item Name'], product['Category'], product['Data'], product['Image Path'])
+                            for product_id, product in zip(self.inventory_df.index.tolist(), self.inventory_df.to_dict('records'))}
+                stock_rows, units, problems = plan_restock(products, rows)
+                if stock_rows:
+                    self.add_stock(stock_rows)
+                span.set(colors=len(stock_rows), problems=len(problems))
+
+            message = f"Added {units} units to {len(stock_rows)} colors."
+            if problems:
+                message += f"\n\nSkipped {len(problems)} line(s):\n" + "\n".join(problems[:20])
+                if len(problems) > 20:
+                    message += f"\n... and {len(problems) - 20} more"
+                QMessageBox.warning(self, "Restock", message)
+            else:
+                QMessageBox.information(self, "Restock", message)
+        except Exception as e:
+            print(f"Error restocking from file: {e}")
+            QMessageBox.warning(self, "Error", f"Could not read the manifest: {e}")
+
     def edit_product_info(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
+            # Saving is refused if another till changes the product while the form is open
+            version = self.product_versions.get(index)
             self.edit_window = QDialog(self)
             self.edit_window.setWindowTitle("Edit Product Info")
             self.edit_window.setGeometry(200, 200, 400, 600)
@@ -895,6 +1316,7 @@ class InventoryApp(QMainWindow):
 
                 model_name_entry = QLineEdit(self.edit_window)
                 model_name_entry.setText(model)
+                model_name_entry.setProperty('original', model)  # Renames and stock changes are saved against what was shown
                 model_layout.addWidget(model_name_entry)
 
                 model_price_entry = QLineEdit(self.edit_window)
@@ -911,10 +1333,12 @@ class InventoryApp(QMainWindow):
 
                     color_entry = QLineEdit(self.edit_window)
                     color_entry.setText(color)
+                    color_entry.setProperty('original', color)
                     color_stock_layout.addWidget(color_entry)
 
                     stock_entry = QLineEdit(self.edit_window)
                     stock_entry.setText(str(stock))
+                    stock_entry.setProperty('shown', stock)
                     color_stock_layout.addWidget(stock_entry)
 
                     colors_layout.addLayout(color_stock_layout)
@@ -959,7 +1383,7 @@ class InventoryApp(QMainWindow):
 
             save_button = QPushButton("Save", self.edit_window)
             save_button.setObjectName("addButton")
-            save_button.clicked.connect(lambda: self.save_product_info(index))
+            save_button.clicked.connect(lambda: self.save_product_info(index, version))
             layout.addWidget(save_button)
 
             self.edit_window.setLayout(layout)
@@ -983,12 +1407,12 @@ class InventoryApp(QMainWindow):
         except Exception as e:
             print(f"Error adding color and stock fields: {e}")
         
-    def save_product_info(self, index):
+    def save_product_info(self, index, version=None):
         try:
             item_name = self.edit_item_name_entry.text()
             category = self.edit_category_combobox.currentText()
             image_path = self.edit_image_path_entry.text()
-            data = {}
+            models = []
 
             valid = True
 
@@ -1000,7 +1424,7 @@ class InventoryApp(QMainWindow):
                 if model_name and model_price.replace('.', '', 1).isdigit():
                     model_price = float(model_price)
                     model_fee = float(model_fee) if model_fee else 0.0
-                    colors = {}
+                    colors = []
 
                     for i in range(colors_layout.count()):
                         color_layout = colors_layout.itemAt(i).layout()
@@ -1013,7 +1437,7 @@ class InventoryApp(QMainWindow):
                         if color and stock.isdigit():
                             stock_quantity = int(stock)
                             if stock_quantity >= 0:
-                                colors[color] = stock_quantity
+                                colors.append((color_entry.property('original'), color, stock_entry.property('shown'), stock_quantity))
                             else:
                                 valid = False
                                 break
@@ -1021,22 +1445,25 @@ class InventoryApp(QMainWindow):
                             valid = False
                             break
 
-                    if not colors:
-                        valid = False
+                    if not colors or len({color for _, color, _, _ in colors}) < len(colors):
+                        valid = False  # No colors, or the same color twice
 
-                    data[model_name] = {"Price": model_price, "Fee": model_fee, "Colors": colors}
+                    models.append((model_name_entry.property('original'), self.normalize_model_name(model_name), model_price, model_fee, colors))
                 else:
                     valid = False
                     break
 
-            if valid and item_name and category and data and os.path.exists(image_path):
-                self.inventory_df.at[index, 'Item Name'] = item_name
-                self.inventory_df.at[index, 'Category'] = category
-                self.inventory_df.at[index, 'Data'] = data
-                self.inventory_df.at[index, 'Image Path'] = image_path
+            if len({model for _, model, _, _, _ in models}) < len(models):
+                valid = False  # The same model twice
 
-                self.save_inventory()
-                QMessageBox.information(self, "Success", "Product information updated.")
+            if valid and item_name and category and models and os.path.exists(image_path):
+                with tracer.span("save_product_info", models=len(models)):
+                    saved = self.save_product(index, item_name, category, image_path, models, version)
+                if saved:
+                    QMessageBox.information(self, "Success", "Product information updated.")
+                else:
+                    QMessageBox.warning(self, "Error", "Another till changed this product while you were editing it. "
+                                                       "Your changes were not saved; please edit it again.")
                 self.edit_window.close()
             else:
                 QMessageBox.warning(self, "Error", "Please enter valid item details and ensure at least one model with colors and stock.")    
@@ -1060,7 +1487,7 @@ class InventoryApp(QMainWindow):
 
     def order_product(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
             self.order_window = QDialog(self)
             self.order_window.setWindowTitle(f"Order {product['Item Name']}")
             self.order_window.setGeometry(200, 200, 400, 400)
@@ -1117,52 +1544,36 @@ class InventoryApp(QMainWindow):
 
     def generate_receipt(self, index):
         try:
-            product = self.inventory_df.iloc[index]
+            product = self.inventory_df.loc[index]
             shipping_fee = self.shipping_fee_entry.text()
             order_quantity = self.order_quantity_entry.text()
             order_name = self.order_name_entry.text() or "No Name"
             selected_model = self.order_model_combobox.currentText()
             selected_color = self.order_colors_combobox.currentText()
-            order_date = datetime.datetime.now().strftime("%Y-%m-%d %I:%M:%S %p")
+            order_date = datetime.datetime.now().strftime(ORDER_DATE_FORMAT)
 
             if order_quantity.isdigit() and (shipping_fee.replace('.', '', 1).isdigit() or shipping_fee == ""):
                 order_quantity = int(order_quantity)
-                unit_price = product['Data'][selected_model]['Price']
-                model_fee = product['Data'][selected_model].get('Fee', 0)
-                total_price_without_shipping = unit_price * order_quantity
+                model_data = product['Data'][selected_model]
 
                 if shipping_fee:
                     shipping_fee = float(shipping_fee)
                 else:
                     shipping_fee = 0.0
 
-                total_price = total_price_without_shipping + shipping_fee
-                net_profit = (unit_price - model_fee) * order_quantity
-
-                if product['Data'][selected_model]['Colors'][selected_color] >= order_quantity:
-                    self.inventory_df.at[index, 'Data'][selected_model]['Colors'][selected_color] -= order_quantity
-
-                    # Update 'Units Sold' for the model and color
-                    if 'Units Sold' in self.inventory_df.at[index, 'Data'][selected_model]:
-                        self.inventory_df.at[index, 'Data'][selected_model]['Units Sold'] += order_quantity
-                    else:
-                        self.inventory_df.at[index, 'Data'][selected_model]['Units Sold'] = order_quantity
-
-                    if 'Units Sold Colors' not in self.inventory_df.at[index, 'Data'][selected_model]:
-                        self.inventory_df.at[index, 'Data'][selected_model]['Units Sold Colors'] = {}
-
-                    if selected_color in self.inventory_df.at[index, 'Data'][selected_model]['Units Sold Colors']:
-                        self.inventory_df.at[index, 'Data'][selected_model]['Units Sold Colors'][selected_color] += order_quantity
-                    else:
-                        self.inventory_df.at[index, 'Data'][selected_model]['Units Sold Colors'][selected_color] = order_quantity
-
-                    self.save_inventory()
-
-                    new_order = pd.DataFrame([[order_name, product['Item Name'], selected_model, selected_color, order_quantity, order_date, unit_price, model_fee, shipping_fee, total_price, net_profit, 'ORDERED']], columns=['Order Name', 'Product Name', 'Model', 'Color', 'Quantity', 'Date', 'Unit Price', 'Model Fee', 'Shipping Fee', 'Total Price', 'Net Profit', 'Status'])
-                    self.orders_df = pd.concat([self.orders_df, new_order], ignore_index=True)
-                    self.save_orders()
+                if model_data['Colors'][selected_color] >= order_quantity:
+                    # The receipt box below waits for the cashier, so only the sale itself is timed
+                    with tracer.span("generate_receipt", quantity=order_quantity):
+                        order = order_record(order_name, product['Item Name'], selected_model, model_data, selected_color,
+                                             order_quantity, shipping_fee, order_date, index)
+                        # Update stock and 'Units Sold' for the model and color
+                        sold = self.sell_stock(index, selected_model, selected_color, order_quantity, order)
+                    if not sold:
+                        available = self.inventory_df.at[index, 'Data'][selected_model]['Colors'][selected_color]
+                        QMessageBox.warning(self, "Error", f"Another till sold this stock first; only {available} left.")
+                        return
 
-                    receipt = f"Order Name: {order_name}\nProduct Name: {product['Item Name']}\nModel: {selected_model}\nColor: {selected_color}\nQuantity: {order_quantity}\nDate: {order_date}\nUnit Price: ${unit_price:.2f}\nModel Fee: ${model_fee:.2f}\nShipping Fee: ${shipping_fee:.2f}\nTotal Price: ${total_price:.2f}\nNet Profit: ${net_profit:.2f}\nStatus: ORDERED"
+                    receipt = f"Order Name: {order_name}\nProduct Name: {product['Item Name']}\nModel: {selected_model}\nColor: {selected_color}\nQuantity: {order_quantity}\nDate: {order_date}\nUnit Price: ${order['Unit Price']:.2f}\nModel Fee: ${order['Model Fee']:.2f}\nShipping Fee: ${shipping_fee:.2f}\nTotal Price: ${order['Total Price']:.2f}\nNet Profit: ${order['Net Profit']:.2f}\nStatus: ORDERED"
                     QMessageBox.information(self, "Receipt", receipt)
                     self.order_window.close()
                 else:
@@ -1176,37 +1587,46 @@ class InventoryApp(QMainWindow):
         try:
             confirm = QMessageBox.question(self, "Confirm Delete", "Are you sure you want to remove this product?", QMessageBox.Yes | QMessageBox.No)
             if confirm == QMessageBox.Yes:
-                self.inventory_df.drop(index, inplace=True)
-                self.save_inventory()
+                with tracer.span("remove_product"):
+                    self.persistence.submit(partial(self.store.remove_product, index), key=('product', index), description="product removal")
+                    self.inventory_df.drop(index, inplace=True)
+                    self.name_index.remove(index)
+                    self.model_index.remove(index)
+                    self.sales_ranking.remove_product(index)
+                    self.populate_phone_model_dropdown()
+                    self.update_inventory_view()
                 self.options_window.close()
                 QMessageBox.information(self, "Success", "Product removed from inventory.")
         except Exception as e:
             print(f"Error removing product: {e}")
 
+    @traced()
     def populate_phone_model_dropdown(self):
+        selected_model = self.phone_model_dropdown.currentText()
+        self.phone_model_dropdown.blockSignals(True)
+        self.phone_model_dropdown.clear()
+        self.phone_model_dropdown.addItem("Select phone model")
         self.phone_model_dropdown.addItem("(NONE)")
-        phone_models = set()
-        for index, row in self.inventory_df.iterrows():
-            for model in row['Data'].keys():
-                phone_models.add(model)
-        self.phone_model_dropdown.addItems(sorted(phone_models))
-
-    def normalize_phone_model(self, model_name):
-        return ''.join(model_name.split()).lower()
+        self.phone_model_dropdown.addItems(self.model_index.model_names())
+        self.phone_model_dropdown.setCurrentIndex(max(self.phone_model_dropdown.findText(selected_model), 0))
+        self.phone_model_dropdown.blockSignals(False)
 
+    @traced()
     def apply_filters(self):
         try:
-            filtered_df = self.inventory_df.copy()
+            filtered_df = self.inventory_df
 
             query = self.search_bar.text().lower()
-            selected_phone_model = self.normalize_phone_model(self.phone_model_dropdown.currentText())
+            selected_phone_model = self.phone_model_dropdown.currentText()
             category = self.category_filter.currentText()
 
             if query and query != "search by name":
-                filtered_df = filtered_df[filtered_df['Item Name'].str.lower().str.contains(query)]
+                # Product ids grow with insertion order, so sorting keeps the grid order
+                filtered_df = filtered_df.loc[sorted(self.name_index.search(query))]
 
-            if selected_phone_model and selected_phone_model != "(none)":
-                filtered_df = filtered_df[filtered_df['Data'].apply(lambda x: any(self.normalize_phone_model(model) == selected_phone_model for model in x.keys()))]
+            # The first two entries are the placeholder and "(NONE)"
+            if self.phone_model_dropdown.currentIndex() > 1:
+                filtered_df = filtered_df.loc[filtered_df.index.intersection(sorted(self.model_index.lookup(selected_phone_model)))]
 
             if category and category != "(NONE)":
                 filtered_df = filtered_df[filtered_df['Category'] == category]
@@ -1218,13 +1638,8 @@ class InventoryApp(QMainWindow):
 
     def display_filtered_inventory(self, df):
         try:
-            for i in reversed(range(self.inventory_layout.count())):
-                widget_to_remove = self.inventory_layout.itemAt(i).widget()
-                self.inventory_layout.removeWidget(widget_to_remove)
-                widget_to_remove.setParent(None)
-
-            for index, row in df.iterrows():
-                self.display_product(row, index)
+            with tracer.span("grid rebuild", rows=len(df)):
+                self.product_model.set_rows(self.product_rows(df))
         except Exception as e:
             print(f"Error displaying filtered inventory: {e}")
 
@@ -1268,42 +1683,40 @@ class InventoryApp(QMainWindow):
 
             layout = QVBoxLayout()
 
-            scroll_area = QScrollArea(details_window)
-            scroll_area.setWidgetResizable(True)
-            scroll_content = QWidget()
-            scroll_layout = QVBoxLayout(scroll_content)
-
-            all_details_text = ""
-
-            for index, product in self.inventory_df.iterrows():
-                all_details_text += f"<u><b><span style='color:blue;'>Product: {product['Item Name']}</span></b></u><br>"
-                all_details_text += f"<b>Category:</b> {product['Category']}<br>"
-                for model, model_data in product['Data'].items():
-                    all_details_text += f"<b>Model:</b> {model}<br>"
-                    all_details_text += f"<b>Price:</b> ${model_data['Price']}<br>"
-                    all_details_text += f"<b>Fee:</b> ${model_data.get('Fee', 0)}<br>"
-                    all_details_text += f"<b>Units Sold:</b> {model_data.get('Units Sold', 0)}<br>"
-                    all_details_text += "<b>Colors and Stock:</b><br>"
-                    for color, stock in model_data['Colors'].items():
-                        all_details_text += f"{color}: {stock}<br>"
-                    all_details_text += "<br>"
-
-            details_label = QLabel(all_details_text)
-            details_label.setTextFormat(Qt.RichText)
-            scroll_layout.addWidget(details_label)
-
-            scroll_area.setWidget(scroll_content)
-            layout.addWidget(scroll_area)
+            filter_entry = QLineEdit(details_window)
+            filter_entry.setPlaceholderText("Filter by name or category...")
+            layout.addWidget(filter_entry)
+
+            # Rows are formatted by the model only when the tree shows them
+            with tracer.span("view_all_details", rows=len(self.inventory_df)):
+                self.details_model = ProductDetailsModel(details_window)
+                self.details_model.set_products(zip(self.inventory_df.index.tolist(), self.inventory_df['Item Name'],
+                                                    self.inventory_df['Category'], self.inventory_df['Data']))
+            filter_entry.textChanged.connect(self.details_model.set_filter)
+
+            details_view = QTreeView(details_window)
+            details_view.setModel(self.details_model)
+            details_view.setUniformRowHeights(True)
+            details_view.setSortingEnabled(True)
+            details_view.sortByColumn(-1, Qt.AscendingOrder)
+            details_view.header().setSectionResizeMode(0, QHeaderView.Stretch)
+            layout.addWidget(details_view)
 
             details_window.setLayout(layout)
             details_window.exec_()
         except Exception as e:
             print(f"Error viewing all details: {e}")
 
+    def view_diagnostics(self):
+        try:
+            StallDiagnosticsDialog(self.watchdog, self).exec_()
+        except Exception as e:
+            print(f"Error viewing diagnostics: {e}")
 
     def view_best_worst_sellers(self):
         try:
-            if not hasattr(self, 'orders_df') or self.orders_df.empty:
+            self.wait_for_orders()
+            if not hasattr(self, 'orders') or not len(self.orders):
                 QMessageBox.warning(self, "No Sales", "There are no sales records to determine best and worst sellers.")
                 return
 
@@ -1313,51 +1726,86 @@ class InventoryApp(QMainWindow):
 
             layout = QVBoxLayout()
 
+            period_layout = QHBoxLayout()
+            self.sellers_period_combobox = QComboBox(best_worst_window)
+            self.sellers_period_combobox.addItems(list(SELLERS_PERIODS) + ["Custom range"])
+            period_layout.addWidget(QLabel("Period:"))
+            period_layout.addWidget(self.sellers_period_combobox)
+
+            self.sellers_start_date_edit = QDateEdit(best_worst_window)
+            self.sellers_start_date_edit.setCalendarPopup(True)
+            self.sellers_start_date_edit.setDisplayFormat("dd/MM/yyyy")
+            self.sellers_start_date_edit.setDate(QDate.currentDate().addMonths(-1))
+            self.sellers_end_date_edit = QDateEdit(best_worst_window)
+            self.sellers_end_date_edit.setCalendarPopup(True)
+            self.sellers_end_date_edit.setDisplayFormat("dd/MM/yyyy")
+            self.sellers_end_date_edit.setDate(QDate.currentDate())
+            period_layout.addWidget(self.sellers_start_date_edit)
+            period_layout.addWidget(self.sellers_end_date_edit)
+            layout.addLayout(period_layout)
+
             scroll_area = QScrollArea(best_worst_window)
             scroll_area.setWidgetResizable(True)
             scroll_content = QWidget()
             scroll_layout = QVBoxLayout(scroll_content)
 
-            all_sales = []
-            for index, row in self.inventory_df.iterrows():
-                product_name = row['Item Name']
-                for model, model_data in row['Data'].items():
-                    for color, units_sold in model_data.get('Units Sold Colors', {}).items():
-                        all_sales.append({
-                            'Product Name': product_name,
-                            'Model': model,
-                            'Color': color,
-                            'Units Sold': units_sold
-                        })
-
-            sales_df = pd.DataFrame(all_sales)
-            if sales_df.empty:
-                QMessageBox.warning(self, "No Sales", "There are no sales records to determine best and worst sellers.")
-                return
-
-            best_sellers = sales_df.nlargest(3, 'Units Sold')
-            worst_sellers = sales_df.nsmallest(3, 'Units Sold')
-
-            best_sellers_text = "<b>Best Sellers:</b><br>"
-            for index, row in best_sellers.iterrows():
-                best_sellers_text += f"{row['Product Name']} - {row['Model']} ({row['Color']})<br>Units Sold: {row['Units Sold']}<br><br>"
-
-            worst_sellers_text = "<b>Worst Sellers:</b><br>"
-            for index, row in worst_sellers.iterrows():
-                worst_sellers_text += f"{row['Product Name']} - {row['Model']} ({row['Color']})<br>Units Sold: {row['Units Sold']}<br><br>"
-
-            details_label = QLabel(best_sellers_text + "<br>" + worst_sellers_text)
-            details_label.setTextFormat(Qt.RichText)
-            scroll_layout.addWidget(details_label)
+            self.sellers_details_label = QLabel()
+            self.sellers_details_label.setTextFormat(Qt.RichText)
+            scroll_layout.addWidget(self.sellers_details_label)
 
             scroll_area.setWidget(scroll_content)
             layout.addWidget(scroll_area)
 
+            self.sellers_period_combobox.currentIndexChanged.connect(self.update_best_worst_sellers)
+            self.sellers_start_date_edit.dateChanged.connect(self.update_best_worst_sellers)
+            self.sellers_end_date_edit.dateChanged.connect(self.update_best_worst_sellers)
+            self.update_best_worst_sellers()
+
             best_worst_window.setLayout(layout)
             best_worst_window.exec_()
         except Exception as e:
             print(f"Error viewing best/worst sellers: {e}")
 
+    @traced()
+    def update_best_worst_sellers(self):
+        try:
+            period = self.sellers_period_combobox.currentText()
+            custom = period not in SELLERS_PERIODS
+            self.sellers_start_date_edit.setEnabled(custom)
+            self.sellers_end_date_edit.setEnabled(custom)
+
+            if period == "All time":
+                best_sellers = [((self.inventory_df.at[index, 'Item Name'], model, color), units_sold)
+                                for (index, model, color), units_sold in self.sales_ranking.top(3)]
+                worst_sellers = [((self.inventory_df.at[index, 'Item Name'], model, color), units_sold)
+                                 for (index, model, color), units_sold in self.sales_ranking.bottom(3)]
+            else:
+                if custom:
+                    start_date = self.sellers_start_date_edit.date().toPyDate()
+                    end_date = self.sellers_end_date_edit.date().toPyDate()
+                else:
+                    end_date = datetime.date.today()
+                    start_date = end_date - datetime.timedelta(days=SELLERS_PERIODS[period] - 1)
+                # Net units per day are kept up to date by orders and refunds,
+                # so the window is summed without rescanning the order history
+                best_sellers, worst_sellers = self.daily_sales.best_and_worst(start_date, end_date, 3)
+
+            if not best_sellers:
+                self.sellers_details_label.setText("There are no sales records in this period.")
+                return
+
+            best_sellers_text = "<b>Best Sellers:</b><br>"
+            for (product_name, model, color), units_sold in best_sellers:
+                best_sellers_text += f"{product_name} - {model} ({color})<br>Units Sold: {units_sold}<br><br>"
+
+            worst_sellers_text = "<b>Worst Sellers:</b><br>"
+            for (product_name, model, color), units_sold in worst_sellers:
+                worst_sellers_text += f"{product_name} - {model} ({color})<br>Units Sold: {units_sold}<br><br>"
+
+            self.sellers_details_label.setText(best_sellers_text + "<br>" + worst_sellers_text)
+        except Exception as e:
+            print(f"Error updating best/worst sellers: {e}")
+
     def view_best_worst_colors(self):
         try:
             best_worst_window = QDialog(self)
@@ -1371,29 +1819,13 @@ class InventoryApp(QMainWindow):
             scroll_content = QWidget()
             scroll_layout = QVBoxLayout(scroll_content)
 
-            all_colors = []
-            for index, row in self.inventory_df.iterrows():
-                product_name = row['Item Name']
-                for model, model_data in row['Data'].items():
-                    for color, units_sold in model_data.get('Units Sold Colors', {}).items():
-                        all_colors.append({
-                            'Product Name': product_name,
-                            'Model': model,
-                            'Color': color,
-                            'Units Sold': units_sold
-                        })
-
-            colors_df = pd.DataFrame(all_colors)
-            best_sellers = colors_df.nlargest(3, 'Units Sold')
-            worst_sellers = colors_df.nsmallest(3, 'Units Sold')
-
             best_sellers_text = "<b>Best Sellers by Color:</b><br>"
-            for index, row in best_sellers.iterrows():
-                best_sellers_text += f"Product: {row['Product Name']}<br>Model: {row['Model']}<br>Color: {row['Color']}<br>Units Sold: {row['Units Sold']}<br><br>"
+            for (index, model, color), units_sold in self.sales_ranking.top(3):
+                best_sellers_text += f"Product: {self.inventory_df.at[index, 'Item Name']}<br>Model: {model}<br>Color: {color}<br>Units Sold: {units_sold}<br><br>"
 
             worst_sellers_text = "<b>Worst Sellers by Color:</b><br>"
-            for index, row in worst_sellers.iterrows():
-                worst_sellers_text += f"Product: {row['Product Name']}<br>Model: {row['Model']}<br>Color: {row['Color']}<br>Units Sold: {row['Units Sold']}<br><br>"
+            for (index, model, color), units_sold in self.sales_ranking.bottom(3):
+                worst_sellers_text += f"Product: {self.inventory_df.at[index, 'Item Name']}<br>Model: {model}<br>Color: {color}<br>Units Sold: {units_sold}<br><br>"
 
             details_label = QLabel(best_sellers_text + "<br>" + worst_sellers_text)
             details_label.setTextFormat(Qt.RichText)
@@ -1408,100 +1840,29 @@ class InventoryApp(QMainWindow):
             print(f"Error viewing best/worst sellers by color: {e}")
 
 
-    def format_orders_sheet(self):
-        try:
-            # Load the workbook and select the sheet
-            workbook = openpyxl.load_workbook(self.order_file)
-            sheet = workbook.active
-
-            # Auto-fit column widths
-            for column in sheet.columns:
-                max_length = 0
-                column = [cell for cell in column]
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(cell.value)
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                sheet.column_dimensions[column[0].column_letter].width = adjusted_width
-                
-            # Highlight "REFUND" rows
-            red_fill = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-            for row in sheet.iter_rows():
-                if row[-1].value == "REFUNDED":
-                    for cell in row:
-                        cell.fill = red_fill
-
-            # Save the workbook with the applied formatting
-            workbook.save(self.order_file)
-        except Exception as e:
-            print(f"Error formatting orders sheet: {e}")
-    
     def track_performance(self):
         try:
             # Convert QDate to datetime
             start_date = self.start_date_edit.date().toPyDate()
             end_date = self.end_date_edit.date().toPyDate()
 
-            # Convert to datetime with time for comparison
+            # Daily totals are kept up to date by orders, refunds and transactions,
+            # so the range query does not depend on how much history there is
+            with tracer.span("track_performance", days=(end_date - start_date).days + 1):
+                self.wait_for_orders()
+                if self.transactions.refresh():
+                    self.build_daily_rollup()  # The ledger was changed by someone else
+                totals = self.daily_rollup.totals(start_date, end_date)
+
+            # Convert to datetime with time for the report
             start_date = pd.to_datetime(start_date)
             end_date = pd.to_datetime(end_date) + pd.Timedelta(days=1)
 
             print(f"Tracking performance from {start_date} to {end_date}")
 
-            # Initialize totals
-            total_revenue = 0.0
-            total_refunds = 0.0
-            total_fees = 0.0
-            has_orders = False
-            has_transactions = False
-
-            # Check orders
-            if hasattr(self, 'orders_df') and not self.orders_df.empty:
-                self.orders_df['Date'] = pd.to_datetime(self.orders_df['Date'], format='%Y-%m-%d %I:%M:%S %p')
-
-                new_orders = self.orders_df[
-                    (self.orders_df['Status'] == 'ORDERED') &
-                    (self.orders_df['Date'].between(start_date, end_date))
-                ]
-                new_refunds = self.orders_df[
-                    (self.orders_df['Status'] == 'REFUNDED') &
-                    (self.orders_df['Date'].between(start_date, end_date))
-                ]
-
-                if not new_orders.empty:
-                    total_revenue = new_orders['Net Profit'].sum()
-                    has_orders = True
-
-                if not new_refunds.empty:
-                    total_refunds = new_refunds['Net Profit'].sum()
-
-            # Check transactions
-            if os.path.exists('Transactions.xlsx'):
-                transactions_df = pd.read_excel('Transactions.xlsx')
-                transactions_df['Date'] = pd.to_datetime(transactions_df['Date'])
-
-                filtered_transactions = transactions_df[
-                    (transactions_df['Date'] >= start_date) & (transactions_df['Date'] <= end_date)
-                ]
-
-                if not filtered_transactions.empty:
-                    total_fees = filtered_transactions['Fees'].sum()
-                    has_transactions = True
-
             # Calculate net profit based on what data we have
-            if has_orders and has_transactions:
-                # Calculate profit using orders minus fees from transactions
-                net_profit = total_revenue + total_refunds - total_fees
-            elif has_orders:
-                # Calculate profit using orders only
-                net_profit = total_revenue + total_refunds
-            elif has_transactions:
-                # No orders, only transactions, calculate using fees (negative)
-                net_profit = -total_fees
-            else:
+            net_profit = period_net_profit(totals)
+            if net_profit is None:
                 # No relevant records in either file
                 QMessageBox.warning(self, "Error", "No data to track performance in the selected date range.")
                 return
@@ -1514,7 +1875,7 @@ class InventoryApp(QMainWindow):
                 'Tracked On': datetime.datetime.now().strftime('%d/%m/%Y %I:%M:%S %p')
             }])
 
-            self.save_performance(performance_entry)
+            self.persistence.submit(partial(self.save_performance, performance_entry), description="performance record", transactional=False)
 
             QMessageBox.information(self, "Performance Tracked", f"Performance tracked from {start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}.\nNet Profit: ${net_profit:.2f}")
             self.performance_window.close()
@@ -1525,55 +1886,21 @@ class InventoryApp(QMainWindow):
 
 
     def calculate_total_fees(self, start_date, end_date):
-        """Calculate total fees from Transactions.xlsx within the specified date range."""
-        total_fees = 0.0
-        if os.path.exists('Transactions.xlsx'):
-            transactions_df = pd.read_excel('Transactions.xlsx')
-            transactions_df['Date'] = pd.to_datetime(transactions_df['Date'])
-
-            filtered_transactions = transactions_df[
-                (transactions_df['Date'] >= start_date) & (transactions_df['Date'] <= end_date)
-            ]
-            total_fees = filtered_transactions['Fees'].sum()
-        
-        return total_fees
+        """Calculate total fees from the transactions ledger within the specified date range."""
+        self.wait_for_orders()
+        self.transactions.refresh()
+        return self.transactions.total_fees(start_date, end_date)
 
     def save_performance(self, performance_entry):
-        try:
-            performance_file = self.performance_file
-            if os.path.exists(performance_file):
-                performance_df = pd.read_excel(performance_file)
-                performance_df = pd.concat([performance_df, performance_entry], ignore_index=True)
-            else:
-                performance_df = performance_entry
+        performance_file = self.performance_file
+        if os.path.exists(performance_file):
+            performance_df = pd.read_excel(performance_file)
+            performance_df = pd.concat([performance_df, performance_entry], ignore_index=True)
+        else:
+            performance_df = performance_entry
 
-            performance_df.to_excel(performance_file, index=False)
+        write_sheet(performance_file, performance_df)
 
-            self.format_performance_sheet(performance_file)
-        except Exception as e:
-            print(f"Error saving performance: {e}")
-
-    def format_performance_sheet(self, performance_file):
-        try:
-            workbook = openpyxl.load_workbook(performance_file)
-            sheet = workbook.active
-
-            for column in sheet.columns:
-                max_length = 0
-                column = [cell for cell in column]
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(cell.value)
-                    except:
-                        pass
-                adjusted_width = (max_length + 2)
-                sheet.column_dimensions[column[0].column_letter].width = adjusted_width
-
-            workbook.save(performance_file)
-        except Exception as e:
-            print(f"Error formatting performance sheet: {e}")
-            
     def open_transaction_dialog(self):
         """Opens a dialog window for recording a new transaction."""
         self.transaction_dialog = QDialog(self)
@@ -1734,7 +2061,7 @@ class InventoryApp(QMainWindow):
         """
 
     def record_transaction(self):
-        """Records the transaction details into Transactions.xlsx."""
+        """Records the transaction details into the transactions ledger."""
         try:
             # Get input values
             title = self.transaction_title_entry.text()
@@ -1743,22 +2070,25 @@ class InventoryApp(QMainWindow):
             fees = float(self.transaction_fee_entry.text()) if self.transaction_fee_entry.text() else 0.0
 
             # Create a new transaction entry
-            new_transaction = pd.DataFrame([{
+            new_transaction = {
                 'Title': title,
                 'Description': description,
                 'Date': date,
                 'Fees': fees
-            }])
-
-            # Load or create Transactions.xlsx
-            if os.path.exists('Transactions.xlsx'):
-                transactions_df = pd.read_excel('Transactions.xlsx')
-                transactions_df = pd.concat([transactions_df, new_transaction], ignore_index=True)
-            else:
-                transactions_df = new_transaction
+            }
 
-            # Save the updated transactions data
-            transactions_df.to_excel('Transactions.xlsx', index=False)
+            with tracer.span("record_transaction"):
+                self.wait_for_orders()
+                if self.shared_store:
+                    # Other tills append to the same ledger, so it is read back rather than added to in memory
+                    self.transactions.extend([new_transaction])
+                    self.transactions.sync()
+                    self.transactions.refresh()
+                    self.build_daily_rollup()
+                else:
+                    self.transactions.record(new_transaction)
+                    self.persistence.submit(partial(self.transactions.persist, [new_transaction]), description="transaction record")
+                    self.daily_rollup.add(self.transaction_date_entry.date().toPyDate(), {'Fees': fees, 'Transactions': 1})
 
             QMessageBox.information(self, "Transaction Recorded", "The transaction has been successfully recorded.")
             self.transaction_dialog.close()
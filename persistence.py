@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from itertools import count
+from tracing import tracer
+
+MAX_BATCH = 256
+MAX_BATCH_SECONDS = 0.1  # A batch holds the store's write lock, which sales on the GUI thread wait for
+
+
+def fsync_directory(path):
+    """Makes a rename in ``path``'s directory durable; not possible (or needed) on Windows."""
+    try:
+        directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(directory)
+    except OSError:
+        pass
+    finally:
+        os.close(directory)
+
+
+@contextmanager
+def replace_atomically(path):
+    """Yields a temporary path to write; on success it is fsynced and renamed over ``path``.
+
+    Readers and crashes only ever see the old file or the complete new one.
+    """
+    temp_path = path + '.tmp'
+    try:
+        yield temp_path
+        with open(temp_path, 'rb+') as temp_file:
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    fsync_directory(path)
+
+
+class PersistenceWorker(threading.Thread):
+    """Runs disk writes on a dedicated thread, in the order they were submitted.
+
+    Jobs submitted with a key replace a still-queued job with the same key and
+    move to the back of the queue, so repeated snapshot writes of one file or
+    row collapse into the latest one without ever running ahead of jobs that
+    were submitted before it. Failures are passed to ``on_error`` (called on
+    the worker thread) and never stop the queue.
+
+    Jobs that queue up while a batch is being written are committed together:
+    the whole batch runs inside one ``transaction()`` and the registered
+    ``sync`` callables (journal fsyncs) run once before it commits, so the
+    number of fsyncs per sale goes down as the load goes up. A batch takes
+    queued jobs until it has run ``MAX_BATCH`` of them or for
+    ``MAX_BATCH_SECONDS``, so other writers never wait long for the lock.
+    """
+
+    def __init__(self, on_error=None, transaction=None):
+        super().__init__(name="PersistenceWorker", daemon=True)
+        self.on_error = on_error
+        self.transaction = transaction
+        self._syncs = []
+        self._queue = OrderedDict()
+        self._ids = count()
+        self._condition = threading.Condition()
+        self._busy = False
+        self._stopping = False
+        self.failures = 0
+
+    def submit(self, job, key=None, description="write", transactional=True):
+        """Queues a job to run on the worker thread.
+
+        Exports and other long jobs that do not write to the store should pass
+        ``transactional=False`` so they do not hold its transaction open.
+        """
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("Persistence worker is stopped")
+            if key is None:
+                key = ('job', next(self._ids))
+            self._queue.pop(key, None)
+            self._queue[key] = (job, description, transactional)
+            self._condition.notify_all()
+
+    def register_sync(self, sync):
+        """Adds a callable that makes a batch's appends durable, such as ``Journal.sync``."""
+        with self._condition:
+            self._syncs.append(sync)
+
+    def flush(self, timeout=None):
+        """Blocks until every job submitted so far has run. Returns False on timeout."""
+        with self._condition:
+            return self._condition.wait_for(lambda: not self._queue and not self._busy, timeout)
+
+    def close(self, timeout=None):
+        """Flushes the queue and stops the thread."""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self.is_alive():
+            self.join(timeout)
+
+    def pending(self):
+        with self._condition:
+            return len(self._queue) + self._busy
+
+    def run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._stopping)
+                if not self._queue:
+                    return
+                job, description, transactional = self._queue.popitem(last=False)[1]
+                syncs = list(self._syncs)
+                self._busy = True
+
+            try:
+                with tracer.span("persistence batch") as span, \
+                        self.transaction() if transactional and self.transaction is not None else nullcontext():
+                    started = time.monotonic()
+                    jobs = 0
+                    while job is not None:
+                        self._run_job(job, description)
+                        jobs += 1
+                        job, description = self._next_job(transactional, jobs, started)
+                    span.set(jobs=jobs)
+                    with tracer.span("fsync journals", journals=len(syncs)):
+                        for sync in syncs:
+                            sync()
+            except Exception as e:
+                self._report("batch commit", e)
+            finally:
+                with self._condition:
+                    self._busy = False
+                    self._condition.notify_all()
+
+    def _next_job(self, transactional, jobs, started):
+        """Returns the next queued (job, description) that fits in the running batch, or (None, None)."""
+        with self._condition:
+            if (not self._queue or jobs >= MAX_BATCH or time.monotonic() - started >= MAX_BATCH_SECONDS
+                    or next(iter(self._queue.values()))[2] != transactional):
+                return None, None
+            job, description, _ = self._queue.popitem(last=False)[1]
+            return job, description
+
+    def _run_job(self, job, description):
+        try:
+            with tracer.span(description):
+                job()
+        except Exception as e:
+            self._report(description, e)
+
+    def _report(self, description, error):
+        self.failures += 1
+        print(f"Error in {description}: {error}")
+        if self.on_error is not None:
+            self.on_error(description, error)
@@ -0,0 +1,156 @@
+import heapq
+from collections import defaultdict
+
+
+class IndexedHeap:
+    """Binary heap with a position map, so any key's value can change in O(log n).
+
+    With ``largest_first`` the root holds the largest value, otherwise the
+    smallest. Ties are broken by the order in which keys were first added.
+    """
+
+    def __init__(self, largest_first=True):
+        self.largest_first = largest_first
+        self.heap = []
+        self.positions = {}
+        self.values = {}
+        self.sequence = {}
+        self._next_sequence = 0
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, key):
+        return key in self.positions
+
+    def set(self, key, value):
+        if key not in self.positions:
+            self.sequence[key] = self._next_sequence
+            self._next_sequence += 1
+            self.values[key] = value
+            self.heap.append(key)
+            self.positions[key] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+            return
+
+        old_value = self.values[key]
+        self.values[key] = value
+        position = self.positions[key]
+        if self._before_value(value, old_value):
+            self._sift_up(position)
+        else:
+            self._sift_down(position)
+
+    def discard(self, key):
+        position = self.positions.pop(key, None)
+        if position is None:
+            return
+        del self.values[key]
+        del self.sequence[key]
+        last = self.heap.pop()
+        if position < len(self.heap):
+            self.heap[position] = last
+            self.positions[last] = position
+            self._sift_up(position)
+            self._sift_down(self.positions[last])
+
+    def first(self, count):
+        """Returns up to ``count`` (key, value) pairs in heap order, in O(count log count)."""
+        result = []
+        if not self.heap:
+            return result
+        candidates = [(self._priority(0), 0)]
+        while candidates and len(result) < count:
+            _, position = heapq.heappop(candidates)
+            key = self.heap[position]
+            result.append((key, self.values[key]))
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < len(self.heap):
+                    heapq.heappush(candidates, (self._priority(child), child))
+        return result
+
+    def _priority(self, position):
+        key = self.heap[position]
+        value = self.values[key]
+        return (-value if self.largest_first else value, self.sequence[key])
+
+    def _before_value(self, value, other):
+        return value > other if self.largest_first else value < other
+
+    def _before(self, position, other):
+        return self._priority(position) < self._priority(other)
+
+    def _swap(self, position, other):
+        self.heap[position], self.heap[other] = self.heap[other], self.heap[position]
+        self.positions[self.heap[position]] = position
+        self.positions[self.heap[other]] = other
+
+    def _sift_up(self, position):
+        while position > 0:
+            parent = (position - 1) // 2
+            if not self._before(position, parent):
+                break
+            self._swap(position, parent)
+            position = parent
+
+    def _sift_down(self, position):
+        size = len(self.heap)
+        while True:
+            best = position
+            for child in (2 * position + 1, 2 * position + 2):
+                if child < size and self._before(child, best):
+                    best = child
+            if best == position:
+                return
+            self._swap(position, best)
+            position = best
+
+
+class SalesRanking:
+    """Units sold per (product id, model, color), ranked both ways.
+
+    A max-heap and a min-heap over the same counters keep the best and worst
+    sellers available without scanning the catalog; a sale or refund changes
+    one counter and costs O(log n).
+    """
+
+    def __init__(self):
+        self.best = IndexedHeap(largest_first=True)
+        self.worst = IndexedHeap(largest_first=False)
+        self.keys = defaultdict(set)
+
+    def __len__(self):
+        return len(self.best)
+
+    def build(self, products):
+        self.best = IndexedHeap(largest_first=True)
+        self.worst = IndexedHeap(largest_first=False)
+        self.keys.clear()
+        for product_id, data in products:
+            self.set_product(product_id, data)
+
+    def set_product(self, product_id, data):
+        """Replaces every counter of one product with the ones in its Data dict."""
+        self.remove_product(product_id)
+        for model, model_data in data.items():
+            for color, units_sold in model_data.get('Units Sold Colors', {}).items():
+                self.set(product_id, model, color, units_sold)
+
+    def remove_product(self, product_id):
+        for key in self.keys.pop(product_id, ()):
+            self.best.discard(key)
+            self.worst.discard(key)
+
+    def set(self, product_id, model, color, units_sold):
+        key = (product_id, model, color)
+        self.keys[product_id].add(key)
+        self.best.set(key, units_sold)
+        self.worst.set(key, units_sold)
+
+    def top(self, count):
+        """Returns up to ``count`` ((product id, model, color), units sold) pairs, best first."""
+        return self.best.first(count)
+
+    def bottom(self, count):
+        """Returns up to ``count`` ((product id, model, color), units sold) pairs, worst first."""
+        return self.worst.first(count)
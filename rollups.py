@@ -0,0 +1,208 @@
+import datetime
+import heapq
+from collections import Counter
+
+ROLLUP_FIELDS = ('Net Profit', 'Refunds', 'Fees', 'Units', 'Orders', 'Transactions')
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+class FenwickTree:
+    """Binary indexed tree: point updates and prefix sums in O(log n)."""
+
+    def __init__(self, size):
+        self.tree = [0] * (size + 1)
+
+    def __len__(self):
+        return len(self.tree) - 1
+
+    def add(self, position, delta):
+        position += 1
+        while position < len(self.tree):
+            self.tree[position] += delta
+            position += position & -position
+
+    def prefix(self, position):
+        """Sum of positions 0..position inclusive."""
+        total = 0
+        position = min(position + 1, len(self.tree) - 1)
+        while position > 0:
+            total += self.tree[position]
+            position -= position & -position
+        return total
+
+
+class DailyRollup:
+    """Per-day totals of net profit, refunds, fees, units and record counts.
+
+    ``days`` is the materialized aggregate table keyed by date ordinal; each
+    field also has a Fenwick tree over a contiguous day range, so any
+    date-range total is the difference of two prefix sums no matter how long
+    the order history is.
+    """
+
+    def __init__(self):
+        self.days = {}
+        self.first_day = None
+        self.trees = None
+
+    def build(self, rows):
+        """Replaces the table with (date ordinal, field, value) rows."""
+        self.days = {}
+        for day, field, value in rows:
+            self._accumulate(day, field, value)
+        self._rebuild()
+
+    def add(self, day, values):
+        """Adds a dict of field values to one date."""
+        day = day.toordinal()
+        for field, value in values.items():
+            self._accumulate(day, field, value)
+
+        if self.trees is None or not self.first_day <= day < self.first_day + len(self.trees[0]):
+            self._rebuild()
+            return
+        for field, value in values.items():
+            self.trees[ROLLUP_FIELDS.index(field)].add(day - self.first_day, value)
+
+    def totals(self, start_date, end_date):
+        """Returns a dict of field totals for the inclusive date range."""
+        if self.trees is None:
+            return dict.fromkeys(ROLLUP_FIELDS, 0)
+        start = start_date.toordinal() - self.first_day
+        end = end_date.toordinal() - self.first_day
+        if end < 0 or start > end:
+            return dict.fromkeys(ROLLUP_FIELDS, 0)
+        return {field: tree.prefix(end) - (tree.prefix(start - 1) if start > 0 else 0)
+                for field, tree in zip(ROLLUP_FIELDS, self.trees)}
+
+    def _accumulate(self, day, field, value):
+        row = self.days.setdefault(day, dict.fromkeys(ROLLUP_FIELDS, 0))
+        row[field] += value
+
+    def _rebuild(self):
+        if not self.days:
+            self.first_day, self.trees = None, None
+            return
+        # Leave room for a year of new days before the next rebuild
+        self.first_day = min(self.days)
+        size = max(self.days) - self.first_day + 366
+        self.trees = [FenwickTree(size) for _ in ROLLUP_FIELDS]
+        for day, row in self.days.items():
+            for tree, field in zip(self.trees, ROLLUP_FIELDS):
+                if row[field]:
+                    tree.add(day - self.first_day, row[field])
+
+
+class DailySales:
+    """Net units sold per (product name, model, color), partitioned by day and month.
+
+    A date-range query adds up the monthly counters of the months the range
+    covers completely and the daily counters of the days at its two edges, so
+    its cost depends on the width of the range rather than on how many orders
+    have been recorded. Refunds carry negative quantities and net out.
+    """
+
+    def __init__(self):
+        self.days = {}
+        self.months = {}
+
+    def build(self, rows):
+        """Replaces the counters with (date ordinal, (product name, model, color), units) rows."""
+        self.days = {}
+        self.months = {}
+        for day, key, units in rows:
+            self._add(day, key, units)
+
+    def add(self, day_date, key, units):
+        self._add(day_date.toordinal(), key, units)
+
+    def totals(self, start_date, end_date):
+        """Returns a Counter of net units per key for the inclusive date range."""
+        totals = Counter()
+        day = start_date
+        while day <= end_date:
+            month_start = day.replace(day=1)
+            next_month = (month_start + datetime.timedelta(days=32)).replace(day=1)
+            if day == month_start and next_month - datetime.timedelta(days=1) <= end_date:
+                totals.update(self.months.get((day.year, day.month), {}))
+                day = next_month
+            else:
+                totals.update(self.days.get(day.toordinal(), {}))
+                day += datetime.timedelta(days=1)
+        return totals
+
+    def best_and_worst(self, start_date, end_date, count):
+        """Returns the ``count`` best and worst selling (key, units) pairs in the date range."""
+        totals = [(key, units) for key, units in self.totals(start_date, end_date).items()]
+        best = heapq.nlargest(count, totals, key=lambda item: item[1])
+        worst = heapq.nsmallest(count, totals, key=lambda item: item[1])
+        return best, worst
+
+    def _add(self, day, key, units):
+        date = datetime.date.fromordinal(day)
+        self.days.setdefault(day, Counter())[key] += units
+        self.months.setdefault((date.year, date.month), Counter())[key] += units
+
+
+def order_rollup_rows(orders_df):
+    """Aggregates a typed orders frame into (date ordinal, field, value) rows."""
+    if orders_df.empty:
+        return []
+    frame = orders_df[['Status', 'Quantity', 'Net Profit']].copy()
+    frame['Day'] = orders_df['Date'].to_numpy() // 86400 + EPOCH_ORDINAL
+    frame['Ordered'] = (frame['Status'] == 'ORDERED').to_numpy()
+    frame['Refunded'] = (frame['Status'] == 'REFUNDED').to_numpy()
+    frame['Ordered Profit'] = frame['Net Profit'].where(frame['Ordered'], 0.0)
+    frame['Refunded Profit'] = frame['Net Profit'].where(frame['Refunded'], 0.0)
+    daily = frame.groupby('Day')[['Ordered Profit', 'Refunded Profit', 'Quantity', 'Ordered']].sum()
+
+    rows = []
+    for day, net_profit, refunds, units, orders in daily.itertuples(name=None):
+        rows += [(int(day), 'Net Profit', float(net_profit)), (int(day), 'Refunds', float(refunds)),
+                 (int(day), 'Units', int(units)), (int(day), 'Orders', int(orders))]
+    return rows
+
+
+def order_rollup_values(order):
+    """Returns the DailyRollup.add values of one order record."""
+    if order['Status'] == 'ORDERED':
+        return {'Net Profit': order['Net Profit'], 'Units': order['Quantity'], 'Orders': 1}
+    return {'Refunds': order['Net Profit'], 'Units': order['Quantity']}
+
+
+def period_net_profit(totals):
+    """Returns the net profit of a DailyRollup.totals result, or None if it has no orders or transactions."""
+    has_orders = totals['Orders'] > 0
+    has_transactions = totals['Transactions'] > 0
+    if has_orders and has_transactions:
+        # Profit from orders minus the fees from transactions
+        return totals['Net Profit'] + totals['Refunds'] - totals['Fees']
+    if has_orders:
+        return totals['Net Profit'] + totals['Refunds']
+    if has_transactions:
+        # No orders, only the fees count (negative)
+        return -totals['Fees']
+    return None
+
+
+def transaction_rollup_rows(ledger):
+    """Aggregates a TransactionLedger into (date ordinal, field, value) rows."""
+    daily = {}
+    for day, transaction in zip(ledger.dates, ledger.records):
+        fees, count = daily.get(day, (0.0, 0))
+        daily[day] = (fees + float(transaction['Fees'] or 0.0), count + 1)
+    rows = []
+    for day, (fees, count) in daily.items():
+        rows += [(day, 'Fees', fees), (day, 'Transactions', count)]
+    return rows
+
+
+def order_sales_rows(orders_df):
+    """Aggregates a typed orders frame into (date ordinal, (product name, model, color), units) rows."""
+    if orders_df.empty:
+        return []
+    frame = orders_df[['Product Name', 'Model', 'Color', 'Quantity']].copy()
+    frame['Day'] = orders_df['Date'].to_numpy() // 86400 + EPOCH_ORDINAL
+    daily = frame.groupby(['Day', 'Product Name', 'Model', 'Color'], observed=True)['Quantity'].sum()
+    return [(int(day), (product_name, model, color), int(units))
+            for (day, product_name, model, color), units in daily.items()]
@@ -0,0 +1,250 @@
+import datetime
+import os
+import re
+from collections import defaultdict
+import pandas as pd
+from journal import ORDER_COLUMNS, ORDER_DATE_FORMAT
+
+
+class BatchError(ValueError):
+    """Raised when a batch has problems; ``errors`` lists every one of them."""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} problem(s) in batch")
+        self.errors = errors
+
+
+def read_rows(path):
+    """Reads a CSV or Excel file into a list of row dicts, with blanks as None."""
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xls'):
+        frame = pd.read_excel(path)
+    else:
+        frame = pd.read_csv(path)
+    frame.columns = [str(column).strip() for column in frame.columns]
+    if 'Date' in frame.columns:
+        frame['Date'] = pd.to_datetime(frame['Date'])
+    if 'Product ID' in frame.columns:
+        frame['Product ID'] = frame['Product ID'].astype('Int64')
+    frame = frame.astype(object).where(frame.notna(), None)
+    return frame.to_dict('records')
+
+
+def normalize_model_name(model_name):
+    # Remove leading/trailing spaces and normalize internal spaces
+    return re.sub(r'\s+', ' ', str(model_name).strip())
+
+
+def apply_sale(model_data, color, quantity):
+    """Takes sold units off a color's stock and adds them to the units sold counters."""
+    model_data['Colors'][color] -= quantity
+    model_data['Units Sold'] = model_data.get('Units Sold', 0) + quantity
+    units_sold_colors = model_data.setdefault('Units Sold Colors', {})
+    units_sold_colors[color] = units_sold_colors.get(color, 0) + quantity
+
+
+def apply_refund(model_data, color, quantity):
+    """Puts refunded units back in stock and takes them off the units sold counters."""
+    model_data['Colors'][color] += quantity
+    units_sold_colors = model_data.get('Units Sold Colors', {})
+    if color in units_sold_colors:
+        units_sold_colors[color] = max(units_sold_colors[color] - quantity, 0)
+        model_data['Units Sold'] = max(model_data.get('Units Sold', 0) - quantity, 0)
+
+
+def apply_edit(data, models):
+    """Applies an edit form's models to a product's Data dict in place, as ``InventoryStore.edit_product`` does."""
+    old = dict(data)
+    data.clear()
+    for original, model, price, fee, colors in models:
+        old_model = old.get(original, {})
+        old_stock = old_model.get('Colors', {})
+        units_sold_colors = dict(old_model.get('Units Sold Colors', {}))
+        model_data = {'Price': price, 'Fee': fee, 'Colors': {}}
+        if 'Units Sold' in old_model:
+            model_data['Units Sold'] = old_model['Units Sold']
+        renamed = {}
+        for original_color, color, shown, stock in colors:
+            if original_color in old_stock:
+                model_data['Colors'][color] = max(old_stock[original_color] + stock - shown, 0)
+                if original_color in units_sold_colors:
+                    renamed[color] = units_sold_colors.pop(original_color)
+            else:
+                model_data['Colors'][color] = stock
+        units_sold_colors.update(renamed)
+        if units_sold_colors:
+            model_data['Units Sold Colors'] = units_sold_colors
+        data[model] = model_data
+
+
+def unchanged_models(data):
+    """Returns the edit form models of a product as it is, for ``apply_edit`` and ``InventoryStore.edit_product``."""
+    return [(model, model, model_data['Price'], model_data.get('Fee', 0),
+             [(color, color, stock, stock) for color, stock in model_data['Colors'].items()])
+            for model, model_data in data.items()]
+
+
+def order_record(order_name, product_name, model, model_data, color, quantity, shipping_fee, order_date, product_id=None):
+    """Returns the journal record of a sale.
+
+    Records that name their ``product_id`` can have their stock change
+    replayed if a crash kept it from the database (see
+    ``InventoryStore.order_transaction``).
+    """
+    unit_price = model_data['Price']
+    model_fee = model_data.get('Fee', 0)
+    total_price = unit_price * quantity + shipping_fee
+    net_profit = (unit_price - model_fee) * quantity
+    record = dict(zip(ORDER_COLUMNS, [order_name, product_name, model, color, quantity, order_date, unit_price,
+                                      model_fee, shipping_fee, total_price, net_profit, 'ORDERED']))
+    return _with_product_id(record, product_id)
+
+
+def refund_record(product_name, model, model_data, color, quantity, shipping_fee, refund_date, product_id=None):
+    unit_price = model_data['Price']
+    model_fee = model_data.get('Fee', 0)
+    net_profit = (unit_price - model_fee) * quantity
+    order_name = f"Refund-{product_name}-{refund_date.strftime('%Y%m%d%H%M%S')}"
+    record = dict(zip(ORDER_COLUMNS, [order_name, product_name, model, color, -quantity, refund_date.strftime(ORDER_DATE_FORMAT),
+                                      unit_price, model_fee, shipping_fee, shipping_fee, -net_profit, 'REFUNDED']))
+    return _with_product_id(record, product_id)
+
+
+def _with_product_id(record, product_id):
+    if product_id is not None:
+        record['Product ID'] = int(product_id)
+    return record
+
+
+def stock_row(product_id, model, model_data, color):
+    """Returns the InventoryStore.set_stock_many row for one color."""
+    return (product_id, model, color, model_data['Colors'][color],
+            model_data.get('Units Sold Colors', {}).get(color), model_data.get('Units Sold'))
+
+
+class Catalog:
+    """Resolves product, model and color references from import files.
+
+    ``products`` maps product ids to (item name, category, data, image path);
+    models are matched with normalized whitespace and colors after stripping.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        self.ids_by_name = defaultdict(list)
+        for product_id, (item_name, _, _, _) in products.items():
+            self.ids_by_name[str(item_name).strip().lower()].append(product_id)
+
+    def product(self, product_id, product_name):
+        """Returns the id of the product given by id or by name, or raises KeyError with the reason."""
+        if product_id is not None:
+            if product_id not in self.products:
+                raise KeyError(f"unknown product id {product_id}")
+            return product_id
+        ids = self.ids_by_name.get(str(product_name).strip().lower(), [])
+        if not ids:
+            raise KeyError(f"unknown product {product_name!r}")
+        if len(ids) > 1:
+            raise KeyError(f"product name {product_name!r} is ambiguous, give a Product ID")
+        return ids[0]
+
+    def resolve(self, product_id, product_name, model, color):
+        """Returns (product id, model, color) as stored, or raises KeyError with the reason."""
+        product_id = self.product(product_id, product_name)
+        data = self.products[product_id][2]
+        model = normalize_model_name(model)
+        if model not in data:
+            raise KeyError(f"unknown model {model!r} for {self.products[product_id][0]!r}")
+        color = str(color).strip()
+        if color not in data[model]['Colors']:
+            raise KeyError(f"unknown color {color!r} for {self.products[product_id][0]!r} {model!r}")
+        return product_id, model, color
+
+
+def plan_orders(products, rows, now=None):
+    """Validates a batch of orders and applies it to the products' Data dicts.
+
+    ``rows`` are dicts with 'Product Name' (or 'Product ID'), 'Model',
+    'Color' and 'Quantity', and optionally 'Order Name', 'Shipping Fee' and
+    'Date' (a datetime). Stock is checked for the batch as a whole before
+    anything is changed; on any problem a BatchError listing every one is
+    raised and the Data dicts are left untouched. Returns the order records
+    and the set_stock_many rows for every color that changed.
+    """
+    now = now or datetime.datetime.now()
+    catalog = Catalog(products)
+    errors = []
+    resolved = []
+    demand = defaultdict(int)
+
+    for line, row in enumerate(rows, start=2):  # Line 1 is the header
+        try:
+            key = catalog.resolve(row.get('Product ID'), row.get('Product Name'), row.get('Model'), row.get('Color'))
+            quantity = int(row.get('Quantity'))
+            if quantity <= 0 or quantity != float(row.get('Quantity')):
+                raise ValueError
+            shipping_fee = float(row.get('Shipping Fee') or 0.0)
+            if shipping_fee < 0:
+                raise ValueError
+        except KeyError as e:
+            errors.append(f"Line {line}: {e.args[0]}")
+            continue
+        except (TypeError, ValueError):
+            errors.append(f"Line {line}: invalid quantity or shipping fee")
+            continue
+        demand[key] += quantity
+        resolved.append((line, key, quantity, shipping_fee, row))
+
+    for (product_id, model, color), quantity in demand.items():
+        item_name, _, data, _ = products[product_id]
+        stock = data[model]['Colors'][color]
+        if stock < quantity:
+            errors.append(f"Insufficient stock for {item_name} - {model} ({color}): {quantity} ordered, {stock} in stock")
+    if errors:
+        raise BatchError(errors)
+
+    records = []
+    for line, (product_id, model, color), quantity, shipping_fee, row in resolved:
+        item_name, _, data, _ = products[product_id]
+        order_date = row.get('Date') or now
+        apply_sale(data[model], color, quantity)
+        records.append(order_record(row.get('Order Name') or "No Name", item_name, model, data[model], color,
+                                    quantity, shipping_fee, order_date.strftime(ORDER_DATE_FORMAT), product_id))
+
+    stock_rows = [stock_row(product_id, model, products[product_id][2][model], color)
+                  for product_id, model, color in demand]
+    return records, stock_rows
+
+
+def plan_restock(products, rows):
+    """Applies a delivery manifest to the products' Data dicts.
+
+    ``rows`` are dicts with 'Product Name' (or 'Product ID'), 'Model',
+    'Color' and 'Quantity'. Quantities for the same color are added up and
+    applied once. Lines naming an unknown product, model or color, or with an
+    invalid quantity, are skipped and reported. Returns the add_stock_many
+    rows (product id, model, color, quantity) for every restocked color, the
+    number of units added and the problems found.
+    """
+    catalog = Catalog(products)
+    problems = []
+    increments = defaultdict(int)
+
+    for line, row in enumerate(rows, start=2):  # Line 1 is the header
+        try:
+            key = catalog.resolve(row.get('Product ID'), row.get('Product Name'), row.get('Model'), row.get('Color'))
+            quantity = int(row.get('Quantity'))
+            if quantity < 0 or quantity != float(row.get('Quantity')):
+                raise ValueError
+        except KeyError as e:
+            problems.append(f"Line {line}: {e.args[0]}")
+            continue
+        except (TypeError, ValueError):
+            problems.append(f"Line {line}: invalid quantity")
+            continue
+        increments[key] += quantity
+
+    for (product_id, model, color), quantity in increments.items():
+        products[product_id][2][model]['Colors'][color] += quantity
+
+    stock_rows = [(product_id, model, color, quantity) for (product_id, model, color), quantity in increments.items()]
+    return stock_rows, sum(increments.values()), problems
@@ -0,0 +1,145 @@
+from collections import Counter, defaultdict
+from itertools import chain
+import numpy as np
+
+
+def ngrams(text, max_length):
+    """Returns every substring of ``text`` with up to ``max_length`` characters."""
+    return {text[start:start + length]
+            for length in range(1, max_length + 1)
+            for start in range(len(text) - length + 1)}
+
+
+class NameIndex:
+    """Case-insensitive substring index over item names.
+
+    Every 1- to 3-character gram of a name has a posting list of product ids,
+    so short queries are a single lookup and longer ones intersect the
+    postings of their trigrams before checking the few remaining names.
+    """
+
+    GRAM_LENGTH = 3
+
+    def __init__(self):
+        self.postings = defaultdict(set)
+        self.names = {}
+
+    def build(self, products):
+        self.postings.clear()
+        self.names.clear()
+        for product_id, name in products:
+            self.add(product_id, name)
+
+    def add(self, product_id, name):
+        name = str(name).lower()
+        self.names[product_id] = name
+        for gram in ngrams(name, self.GRAM_LENGTH):
+            self.postings[gram].add(product_id)
+
+    def remove(self, product_id):
+        name = self.names.pop(product_id, None)
+        if name is None:
+            return
+        for gram in ngrams(name, self.GRAM_LENGTH):
+            posting = self.postings[gram]
+            posting.discard(product_id)
+            if not posting:
+                del self.postings[gram]
+
+    def state(self):
+        """Returns the index as JSON values and id arrays, for snapshots.
+
+        The posting lists are concatenated into one array of ids, with the
+        length of each gram's list in ``counts``.
+        """
+        grams = list(self.postings)
+        counts = np.array([len(self.postings[gram]) for gram in grams], dtype=np.int64)
+        ids = np.fromiter(chain.from_iterable(self.postings[gram] for gram in grams), dtype=np.int64, count=int(counts.sum()))
+        return {'names': list(self.names.items()), 'grams': grams, 'counts': counts, 'ids': ids}
+
+    def restore(self, state):
+        self.names = dict(state['names'])
+        self.postings = defaultdict(set)
+        ids = state['ids'].tolist()
+        start = 0
+        for gram, end in zip(state['grams'], np.cumsum(state['counts']).tolist()):
+            self.postings[gram] = set(ids[start:end])
+            start = end
+
+    def update(self, product_id, name):
+        if self.names.get(product_id) != str(name).lower():
+            self.remove(product_id)
+            self.add(product_id, name)
+
+    def search(self, query):
+        """Returns the ids of products whose name contains ``query``."""
+        query = query.lower()
+        if len(query) <= self.GRAM_LENGTH:
+            return set(self.postings.get(query, ()))
+
+        grams = [query[start:start + self.GRAM_LENGTH] for start in range(len(query) - self.GRAM_LENGTH + 1)]
+        postings = sorted((self.postings.get(gram, set()) for gram in set(grams)), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        return {product_id for product_id in candidates if query in self.names[product_id]}
+
+
+def normalize_phone_model(model_name):
+    return ''.join(model_name.split()).lower()
+
+
+class ModelIndex:
+    """Maps normalized phone model names to the ids of products that carry them."""
+
+    def __init__(self):
+        self.products = defaultdict(set)
+        self.names = Counter()
+        self.models = {}
+
+    def build(self, products):
+        self.products.clear()
+        self.names.clear()
+        self.models.clear()
+        for product_id, data in products:
+            self.set_models(product_id, data.keys())
+
+    def set_models(self, product_id, models):
+        self.remove(product_id)
+        models = list(models)
+        self.models[product_id] = models
+        for model in models:
+            self.products[normalize_phone_model(model)].add(product_id)
+        self.names.update(models)
+
+    def remove(self, product_id):
+        models = self.models.pop(product_id, None)
+        if models is None:
+            return
+        for model in models:
+            normalized_model = normalize_phone_model(model)
+            posting = self.products[normalized_model]
+            posting.discard(product_id)
+            if not posting:
+                del self.products[normalized_model]
+            self.names[model] -= 1
+            if self.names[model] <= 0:
+                del self.names[model]
+
+    def state(self):
+        """Returns the index as JSON values, for snapshots."""
+        return {'products': {model: list(product_ids) for model, product_ids in self.products.items()},
+                'names': dict(self.names), 'models': list(self.models.items())}
+
+    def restore(self, state):
+        self.products = defaultdict(set, {model: set(product_ids) for model, product_ids in state['products'].items()})
+        self.names = Counter(state['names'])
+        self.models = dict(state['models'])
+
+    def lookup(self, model_name):
+        return set(self.products.get(normalize_phone_model(model_name), ()))
+
+    def model_names(self):
+        return sorted(self.names)
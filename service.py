@@ -0,0 +1,561 @@
+"""Local HTTP/JSON service for the web shop and other point-of-sale software.
+
+    python service.py serve                      # http://127.0.0.1:8765
+    python service.py loadtest --requests 20000  # against a running service
+
+Endpoints (JSON in, JSON out):
+    GET  /stock?product_id=12[&model=...&color=...]   (or product_name=... instead of product_id)
+    POST /orders       {"product_id" or "product_name", "model", "color", "quantity", "shipping_fee", "order_name"}
+    POST /refunds      {"product_id" or "product_name", "model", "color", "quantity", "shipping_fee"}
+    GET  /performance?start=2024-01-01&end=2024-01-31
+
+The service works on the same inventory.db and journals as the app and
+keeps the catalog in memory, so stock lookups never touch the disk. Orders
+and refunds are written by a persistence worker, which commits the ones
+that arrive together in one transaction; each is answered once its
+transaction has committed. Run the tills with INVMAN_SHARED_STORE next to
+it, so that they and the service never sell the same units.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import signal
+import sys
+import time
+from contextlib import contextmanager
+from functools import partial
+from urllib.parse import parse_qs, urlsplit
+from journal import ORDER_DATE_FORMAT, Journal, OrderJournal
+from ledger import TRANSACTION_DATE_FORMAT
+from persistence import PersistenceWorker
+from rollups import DailyRollup, order_rollup_rows, order_rollup_values, period_net_profit
+from sales import Catalog, apply_refund, apply_sale, order_record, refund_record
+from storage import ConflictError, InventoryStore
+
+DATABASE_FILE = 'inventory.db'
+ORDER_JOURNAL_FILE = 'orders.journal'
+ORDERS_SNAPSHOT_FILE = 'orders.snapshot'
+TRANSACTIONS_JOURNAL_FILE = 'transactions.journal'
+HOST = '127.0.0.1'  # Never reachable from other machines
+PORT = 8765
+CHANGE_POLL_INTERVAL = 1.0  # Seconds between checks for changes made by tills and cli.py
+MAX_BODY = 64 * 1024
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           409: 'Conflict', 413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class RequestError(Exception):
+    """Answers the request with ``status`` and a JSON body of {"error": message}."""
+
+    def __init__(self, status, message, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def _settle(future, result, error):
+    if future.done():
+        return  # The client went away
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def _single(query, name):
+    values = query.get(name)
+    return values[0] if values else None
+
+
+def _quantity(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        raise RequestError(400, "quantity must be a positive integer")
+    return value
+
+
+def _fee(value):
+    if value is None:
+        return 0.0
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+        raise RequestError(400, "shipping_fee must be a non-negative number")
+    return float(value)
+
+
+def _transaction_day(transaction):
+    return datetime.datetime.strptime(str(transaction['Date'])[:10], TRANSACTION_DATE_FORMAT).date()
+
+
+def _date(text, name):
+    try:
+        return datetime.date.fromisoformat(text)
+    except (TypeError, ValueError):
+        raise RequestError(400, f"{name} must be a date like 2024-01-31")
+
+
+class InventoryService:
+    """Answers stock, order, refund and performance requests from memory.
+
+    ``products`` maps product ids to (item name, category, data, image path)
+    as in ``Catalog``. Everything in memory is only touched on the event
+    loop; the database and journals are written by the persistence worker,
+    and read in a thread of their own when other terminals changed them.
+    """
+
+    def __init__(self, database_file, order_journal_file, orders_snapshot_file, transactions_journal_file):
+        self.store = InventoryStore(database_file)
+        self.orders = OrderJournal(order_journal_file)
+        self.transactions = Journal(transactions_journal_file)
+        self.orders_snapshot_file = orders_snapshot_file
+        self.loop = None
+        self.products = {}
+        self.catalog = None
+        self.daily_rollup = DailyRollup()
+        self.data_version = None
+        self.last_change = 0
+        self.waiting = set()  # Futures of the writes submitted and not yet answered
+        self.settled = 0  # Writes answered so far
+        self._outcomes = []  # (future, result, error) of the batch being written, on the worker thread
+        self.persistence = PersistenceWorker(on_error=self.write_failed, transaction=self.write_batch)
+        self.persistence.register_sync(self.orders.sync)
+
+    def load(self):
+        """Reads the catalog and the order and fee history, before the server starts."""
+        self.orders.repair()
+        self.transactions.repair()
+        self.data_version = self.store.data_version()
+        self.last_change = self.store.last_change()
+        self.products = {product_id: tuple(product) for product_id, *product in self.store.load_products()}
+        self.catalog = Catalog(self.products)
+
+        self.orders.load_snapshot(self.orders_snapshot_file)
+        self.orders.load()
+        rows = order_rollup_rows(self.orders.to_frame())
+        for transaction in self.transactions.read_new():
+            day = _transaction_day(transaction).toordinal()
+            rows += [(day, 'Fees', float(transaction['Fees'] or 0.0)), (day, 'Transactions', 1)]
+        self.daily_rollup.build(rows)
+
+    def start(self, loop):
+        self.loop = loop
+        self.persistence.start()
+
+    def close(self):
+        self.persistence.close()
+        self.orders.close()
+        self.store.close()
+
+    # Requests
+
+    def stock(self, query):
+        product_id = self.product_id(_single(query, 'product_id'), _single(query, 'product_name'))
+        item_name, category, data, _ = self.products[product_id]
+        model = _single(query, 'model')
+        color = _single(query, 'color')
+        if model is None and color is None:
+            return 200, {'product_id': product_id, 'product_name': item_name, 'category': category,
+                         'models': {model: {'price': model_data['Price'], 'colors': dict(model_data['Colors'])}
+                                    for model, model_data in data.items()}}
+        product_id, model, color = self.resolve(product_id, None, model, color)
+        model_data = data[model]
+        return 200, {'product_id': product_id, 'product_name': item_name, 'model': model, 'color': color,
+                     'price': model_data['Price'], 'stock': model_data['Colors'][color]}
+
+    async def place_order(self, body):
+        """Sells one color like the order dialog, and answers with the order record once it is on disk."""
+        product_id, model, color = self.resolve(body.get('product_id'), body.get('product_name'), body.get('model'), body.get('color'))
+        quantity = _quantity(body.get('quantity'))
+        shipping_fee = _fee(body.get('shipping_fee'))
+        item_name, _, data, _ = self.products[product_id]
+        model_data = data[model]
+        if model_data['Colors'][color] < quantity:
+            raise RequestError(409, "insufficient stock", available=model_data['Colors'][color])
+
+        order = order_record(str(body.get('order_name') or "No Name"), item_name, model, model_data, color, quantity,
+                             shipping_fee, datetime.datetime.now().strftime(ORDER_DATE_FORMAT), product_id)
+        try:
+            await self.write(partial(self.store.sell, product_id, model, color, quantity), order)
+        except ConflictError as e:
+            # A till sold the units first; the change poll brings memory up to date
+            raise RequestError(409, "insufficient stock", available=e.available)
+        apply_sale(self.products[product_id][2][model], color, quantity)
+        return 201, {'order': order}
+
+    async def refund(self, body):
+        """Puts units back like the refund dialog, and answers with the refund record once it is on disk."""
+        product_id, model, color = self.resolve(body.get('product_id'), body.get('product_name'), body.get('model'), body.get('color'))
+        quantity = _quantity(body.get('quantity'))
+        shipping_fee = _fee(body.get('shipping_fee'))
+        item_name, _, data, _ = self.products[product_id]
+        refund = refund_record(item_name, model, data[model], color, quantity, shipping_fee, datetime.datetime.now(), product_id)
+        await self.write(partial(self.store.refund, product_id, model, color, quantity), refund)
+        apply_refund(self.products[product_id][2][model], color, quantity)
+        return 201, {'refund': refund}
+
+    def performance(self, query):
+        start_date = _date(_single(query, 'start'), 'start')
+        end_date = _date(_single(query, 'end'), 'end')
+        if end_date < start_date:
+            raise RequestError(400, "end is before start")
+        self.read_journals()  # Orders and fees recorded by the tills since the last request
+        totals = self.daily_rollup.totals(start_date, end_date)
+        return 200, {'start': start_date.isoformat(), 'end': end_date.isoformat(),
+                     'net_profit': period_net_profit(totals), 'totals': totals}
+
+    def product_id(self, product_id, product_name):
+        if product_id is None and product_name is None:
+            raise RequestError(400, "give product_id or product_name")
+        try:
+            return self.catalog.product(None if product_id is None else int(product_id), product_name)
+        except ValueError:
+            raise RequestError(400, "product_id must be an integer")
+        except KeyError as e:
+            raise RequestError(404, e.args[0])
+
+    def resolve(self, product_id, product_name, model, color):
+        product_id = self.product_id(product_id, product_name)
+        if model is None or color is None:
+            raise RequestError(400, "give model and color")
+        try:
+            return self.catalog.resolve(product_id, None, model, color)
+        except KeyError as e:
+            raise RequestError(404, e.args[0])
+
+    # Writes
+
+    async def write(self, stock_write, record):
+        """Queues a stock write and its journal record, and waits until their batch has committed."""
+        future = self.loop.create_future()
+        self.waiting.add(future)
+        try:
+            self.persistence.submit(partial(self.run_write, stock_write, record, future), description="service write")
+            return await future
+        finally:
+            self.waiting.discard(future)
+            self.settled += 1
+
+    def run_write(self, stock_write, record, future):
+        """Runs on the persistence worker, inside the batch's transaction."""
+        if future.done():
+            return  # Already answered with an error, see write_failed
+        try:
+            # A savepoint, so a refused sale leaves the rest of the batch alone
+            with self.store.transaction():
+                stock_write()
+                self.orders.append(record)
+        except ConflictError as e:
+            self._outcomes.append((future, None, e))
+        except Exception as e:
+            self._outcomes.append((future, None, RequestError(500, f"write failed: {e}")))
+            raise
+        else:
+            self._outcomes.append((future, record, None))
+
+    @contextmanager
+    def write_batch(self):
+        """Runs a persistence batch in one transaction and answers its writes once it has committed."""
+        self._outcomes = []
+        error = None
+        try:
+            with self.store.order_transaction(self.orders):
+                yield
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            outcomes, self._outcomes = self._outcomes, []
+            for future, result, outcome_error in outcomes:
+                if error is not None:
+                    outcome_error = RequestError(500, f"write failed: {error}")
+                self.loop.call_soon_threadsafe(_settle, future, result, outcome_error)
+
+    def write_failed(self, description, error):
+        """Runs on the worker thread. A batch that could not even begin drops its writes unanswered,
+        so every write still waiting is answered with an error and skipped if it runs later."""
+        if description == "batch commit":
+            self.loop.call_soon_threadsafe(self.fail_waiting, error)
+
+    def fail_waiting(self, error):
+        for future in list(self.waiting):
+            _settle(future, None, RequestError(500, f"write failed: {error}"))
+
+    # Changes made elsewhere
+
+    def read_journals(self):
+        """Adds the orders and fees appended since the last read, the service's own included, to the rollup."""
+        for order in self.orders.read_new():
+            order_day = datetime.datetime.strptime(order['Date'], ORDER_DATE_FORMAT).date()
+            self.daily_rollup.add(order_day, order_rollup_values(order))
+        for transaction in self.transactions.read_new():
+            self.daily_rollup.add(_transaction_day(transaction), {'Fees': float(transaction['Fees'] or 0.0), 'Transactions': 1})
+
+    async def watch_changes(self):
+        while True:
+            await asyncio.sleep(CHANGE_POLL_INTERVAL)
+            try:
+                await self.apply_external_changes()
+            except Exception as e:
+                print(f"Error reloading changed products: {e}")
+
+    async def apply_external_changes(self):
+        """Reloads the products other terminals changed since the last poll.
+
+        Products are only swapped in if none of the service's own writes was
+        pending or answered while they were read, since those are applied to
+        memory when they are answered; otherwise the next poll tries again.
+        """
+        if self.waiting:
+            return
+        settled = self.settled
+        data_version = await asyncio.to_thread(self.store.data_version)
+        if data_version == self.data_version:
+            return
+        last_change, products = await asyncio.to_thread(self.read_changes, set(self.products))
+        if self.waiting or self.settled != settled:
+            return
+        self.data_version = data_version
+        self.last_change = last_change
+        if products is None:
+            return
+
+        changed_ids, rows = products
+        for product_id in changed_ids:
+            self.products.pop(product_id, None)  # Removed unless it comes back below
+        for product_id, *product in rows:
+            self.products[product_id] = tuple(product)
+        self.catalog = Catalog(self.products)
+        print(f"Reloaded {len(changed_ids)} product(s) changed by other terminals")
+
+    def read_changes(self, known_ids):
+        """Runs in a thread. Returns (last change id, None or (changed ids, product rows))."""
+        with self.store.reading():
+            last_change, changed_ids = self.store.changes_since(self.last_change)
+            if changed_ids is None:
+                changed_ids = known_ids | set(self.store.versions())
+            if not changed_ids:
+                return last_change, None
+            return last_change, (changed_ids, self.store.load_products(changed_ids))
+
+    # HTTP
+
+    async def dispatch(self, method, target, body):
+        url = urlsplit(target)
+        query = parse_qs(url.query)
+        path = url.path.rstrip('/') or '/'
+        if path == '/stock':
+            self.expect(method, 'GET')
+            return self.stock(query)
+        if path == '/performance':
+            self.expect(method, 'GET')
+            return self.performance(query)
+        if path in ('/orders', '/refunds'):
+            self.expect(method, 'POST')
+            try:
+                payload = json.loads(body or b'{}')
+            except ValueError:
+                raise RequestError(400, "body is not valid JSON")
+            if not isinstance(payload, dict):
+                raise RequestError(400, "body must be a JSON object")
+            return await (self.place_order(payload) if path == '/orders' else self.refund(payload))
+        raise RequestError(404, f"no endpoint {path}")
+
+    @staticmethod
+    def expect(method, allowed):
+        if method != allowed:
+            raise RequestError(405, f"use {allowed}")
+
+    async def handle_connection(self, reader, writer):
+        """Serves HTTP/1.1 requests on one connection, keeping it open between them."""
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                request_line, *header_lines = head.decode('latin-1').rstrip('\r\n').split('\r\n')
+                try:
+                    method, target, version = request_line.split(' ', 2)
+                except ValueError:
+                    break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                    if length > MAX_BODY:
+                        raise RequestError(413, "body is too large")
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload = await self.dispatch(method, target, body)
+                except RequestError as e:
+                    status, payload = e.status, {'error': str(e), **e.details}
+                    keep_alive = keep_alive and e.status != 413
+                except asyncio.IncompleteReadError:
+                    break
+                except Exception as e:
+                    print(f"Error handling {method} {target}: {e}")
+                    status, payload = 500, {'error': "internal error"}
+
+                data = json.dumps(payload, default=str).encode('utf-8')
+                writer.write(f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(args):
+    service = InventoryService(args.database, args.journal, args.orders_snapshot, args.transactions)
+    started = time.perf_counter()
+    service.load()
+    loop = asyncio.get_running_loop()
+    service.start(loop)
+    try:
+        # Stopped by a service manager, shut down as on Ctrl+C
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    except (AttributeError, NotImplementedError):
+        pass  # Windows has neither SIGTERM nor signal handlers in the event loop
+    server = await asyncio.start_server(service.handle_connection, args.host, args.port)
+    watcher = asyncio.create_task(service.watch_changes())
+    print(f"Serving {len(service.products)} products on http://{args.host}:{args.port} "
+          f"(loaded in {time.perf_counter() - started:.2f}s); press Ctrl+C to stop.")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        watcher.cancel()
+        # Every accepted write reaches the disk before exiting
+        service.close()
+
+
+def serve_command(args):
+    if not os.path.exists(args.database):
+        raise SystemExit(f"No inventory database at {args.database}; start InvMan once to create it.")
+    try:
+        asyncio.run(serve(args))
+    except (KeyboardInterrupt, asyncio.CancelledError):
+        pass
+    return 0
+
+
+# Load generator
+
+async def _request(reader, writer, method, target, payload=None):
+    body = b'' if payload is None else json.dumps(payload).encode('utf-8')
+    writer.write(f"{method} {target} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+    head = await reader.readuntil(b'\r\n\r\n')
+    status = int(head.split(b' ', 2)[1])
+    length = 0
+    for line in head.split(b'\r\n'):
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':', 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+def load_targets(database_file):
+    """Returns (product id, model, color) of every color in stock, to pick requests from."""
+    store = InventoryStore(database_file)
+    try:
+        return [(product_id, model, color)
+                for product_id, _, _, data, _ in store.load_products()
+                for model, model_data in data.items()
+                for color, stock in model_data['Colors'].items() if stock]
+    finally:
+        store.close()
+
+
+async def run_load(args, targets):
+    rng = random.Random(args.seed)
+    latencies = []
+    statuses = {}
+    remaining = args.requests
+
+    async def client():
+        nonlocal remaining
+        reader, writer = await asyncio.open_connection(args.host, args.port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                product_id, model, color = rng.choice(targets)
+                if rng.random() < args.orders:
+                    request = ('POST', '/orders', {'product_id': product_id, 'model': model, 'color': color,
+                                                   'quantity': 1, 'order_name': "Load test"})
+                else:
+                    request = ('GET', f"/stock?product_id={product_id}", None)
+                started = time.perf_counter()
+                status = await _request(reader, writer, *request)
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+        finally:
+            writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(args.concurrency)))
+    return time.perf_counter() - started, sorted(latencies), statuses
+
+
+def loadtest_command(args):
+    targets = load_targets(args.database)
+    if not targets:
+        raise SystemExit("No products in stock to request.")
+    if args.orders:
+        print(f"Warning: {args.orders:.0%} of the requests are real orders; run this against a copy of the data.")
+    try:
+        elapsed, latencies, statuses = asyncio.run(run_load(args, targets))
+    except ConnectionError as e:
+        raise SystemExit(f"Could not reach the service on {args.host}:{args.port}: {e}")
+
+    def percentile(fraction):
+        return latencies[min(int(len(latencies) * fraction), len(latencies) - 1)] * 1000
+
+    print(f"{len(latencies)} requests on {args.concurrency} connections in {elapsed:.2f}s: "
+          f"{len(latencies) / elapsed:.0f} requests/s")
+    print(f"Latency p50 {percentile(0.5):.2f} ms, p95 {percentile(0.95):.2f} ms, p99 {percentile(0.99):.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms")
+    print("Statuses: " + ', '.join(f"{status} x{count}" for status, count in sorted(statuses.items())))
+    return 0 if all(status < 500 for status in statuses) else 1
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON service for InvMan.")
+    parser.add_argument('--database', default=DATABASE_FILE, help="inventory database (default: %(default)s)")
+    parser.add_argument('--host', default=HOST, help="address to bind or connect to (default: %(default)s)")
+    parser.add_argument('--port', type=int, default=PORT, help="port (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help="answer stock, order, refund and performance requests")
+    serve_parser.add_argument('--journal', default=ORDER_JOURNAL_FILE, help="order journal (default: %(default)s)")
+    serve_parser.add_argument('--orders-snapshot', default=ORDERS_SNAPSHOT_FILE, help="order snapshot (default: %(default)s)")
+    serve_parser.add_argument('--transactions', default=TRANSACTIONS_JOURNAL_FILE, help="transactions journal (default: %(default)s)")
+    serve_parser.set_defaults(handler=serve_command)
+
+    loadtest = commands.add_parser('loadtest', help="measure the throughput and latency of a running service",
+                                   description="Sends stock lookups (and optionally orders) for random colors in stock "
+                                               "over keep-alive connections and reports requests/s and latency percentiles.")
+    loadtest.add_argument('--requests', type=int, default=10000, help="requests to send (default: %(default)s)")
+    loadtest.add_argument('--concurrency', type=int, default=50, help="open connections (default: %(default)s)")
+    loadtest.add_argument('--orders', type=float, default=0.0, help="fraction of requests that place a one-unit order (default: %(default)s)")
+    loadtest.add_argument('--seed', type=int, default=1, help="random seed (default: %(default)s)")
+    loadtest.set_defaults(handler=loadtest_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
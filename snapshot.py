@@ -0,0 +1,99 @@
+import gc
+import json
+import os
+import struct
+import numpy as np
+from persistence import replace_atomically
+
+SNAPSHOT_FORMAT = 2
+
+
+def source_stamps(paths):
+    """Returns [path, mtime_ns, size] for each source file, with None for missing or empty files.
+
+    Empty files count as missing because SQLite creates an empty WAL file
+    whenever the database is opened.
+    """
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stat = None
+        if stat is None or not stat.st_size:
+            stamps.append([path, None, None])
+        else:
+            stamps.append([path, stat.st_mtime_ns, stat.st_size])
+    return stamps
+
+
+def _header(sources):
+    return {'format': SNAPSHOT_FORMAT, 'sources': source_stamps(sources)}
+
+
+def _split_arrays(value, path, arrays):
+    """Returns ``value`` with the numpy arrays in its dicts replaced by None, collecting (path, array)."""
+    if isinstance(value, np.ndarray):
+        arrays.append((path, value))
+        return None
+    if isinstance(value, dict):
+        return {key: _split_arrays(item, path + [key], arrays) for key, item in value.items()}
+    return value
+
+
+def _read_block(snapshot_file):
+    length, = struct.unpack('<Q', snapshot_file.read(8))
+    return snapshot_file.read(length)
+
+
+def _write_block(snapshot_file, data):
+    snapshot_file.write(struct.pack('<Q', len(data)))
+    snapshot_file.write(data)
+
+
+def read_snapshot(path, sources):
+    """Returns the state saved at ``path`` if the source files are unchanged since, else None.
+
+    Snapshots hold JSON and numpy arrays read with ``allow_pickle=False``,
+    so a tampered file can at worst be unreadable, never run code. The
+    header is checked before the state is decoded, so a stale snapshot costs
+    one small read. The cyclic garbage collector is paused while the state
+    is decoded, since it would otherwise rescan the new objects many times
+    over.
+    """
+    try:
+        with open(path, 'rb') as snapshot_file:
+            if json.loads(_read_block(snapshot_file)) != _header(sources):
+                return None
+            gc.disable()
+            try:
+                document = json.loads(_read_block(snapshot_file))
+                state = document['state']
+                for keys in document['arrays']:
+                    target = state
+                    for key in keys[:-1]:
+                        target = target[key]
+                    target[keys[-1]] = np.load(snapshot_file, allow_pickle=False)
+                return state
+            finally:
+                gc.enable()
+    except (OSError, EOFError, ValueError, TypeError, KeyError, IndexError, struct.error) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
+
+
+def write_snapshot(path, sources, state):
+    """Writes the state to a temporary file and renames it over ``path``.
+
+    ``state`` is a dict of JSON values; numpy arrays of numbers may appear
+    as values in its dicts (not inside lists) and are stored in binary.
+    """
+    arrays = []
+    document = {'state': _split_arrays(state, [], arrays), 'arrays': [keys for keys, _ in arrays]}
+    with replace_atomically(path) as temp_path:
+        with open(temp_path, 'wb') as snapshot_file:
+            _write_block(snapshot_file, json.dumps(_header(sources)).encode('utf-8'))
+            _write_block(snapshot_file, json.dumps(document, separators=(',', ':'), check_circular=False).encode('utf-8'))
+            for _, array in arrays:
+                np.save(snapshot_file, array, allow_pickle=False)
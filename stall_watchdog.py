@@ -0,0 +1,175 @@
+import bisect
+import datetime
+import logging
+import logging.handlers
+import math
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from PyQt5.QtCore import Qt, QObject, QTimer
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import (QDialog, QHBoxLayout, QLabel, QListWidget, QPlainTextEdit, QPushButton, QSplitter,
+                             QTableWidget, QTableWidgetItem, QVBoxLayout, QHeaderView)
+
+STALL_LOGGER = 'invman.stalls'
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+# Upper bounds, in seconds, of the delay histogram buckets; the last bucket is open-ended
+DELAY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0]
+MAX_STALLS = 200
+
+
+def bucket_labels():
+    bounds = [0.0] + DELAY_BUCKETS
+    labels = [f"{low * 1000:.0f}-{high * 1000:.0f} ms" for low, high in zip(bounds, bounds[1:])]
+    return labels + [f"over {DELAY_BUCKETS[-1]:.0f} s"]
+
+
+class Stall:
+    __slots__ = ('started', 'duration', 'stack')
+
+    def __init__(self, started, duration, stack):
+        self.started = started
+        self.duration = duration
+        self.stack = stack
+
+    def summary(self):
+        where = self.stack[-1].strip().splitlines()[0] if self.stack else "stack not captured"
+        return f"{self.started:%Y-%m-%d %H:%M:%S}  {self.duration:.2f} s  {where}"
+
+
+class StallWatchdog(QObject):
+    """Measures how late the GUI event loop runs, and records what blocked it.
+
+    A heartbeat timer fires every ``interval_ms`` on the GUI thread; how much
+    later than due it fires is the event-loop delay, counted in a histogram.
+    A helper thread watches the heartbeat, and once it is ``threshold_ms``
+    overdue it captures the GUI thread's Python stack, while the stall is
+    still in progress. When the heartbeat resumes, the stall is kept with its
+    start time, duration and that stack, and written to the stall log.
+    """
+
+    def __init__(self, threshold_ms=500, interval_ms=100, log_path=None, parent=None):
+        super().__init__(parent)
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.delay_counts = [0] * (len(DELAY_BUCKETS) + 1)
+        self.stall_counts = [0] * (len(DELAY_BUCKETS) + 1)
+        self.stalls = deque(maxlen=MAX_STALLS)
+        self.gui_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._captured_stack = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._helper = threading.Thread(target=self._watch, name="StallWatchdog", daemon=True)
+        self._timer = QTimer(self)
+        self._timer.setTimerType(Qt.PreciseTimer)
+        self._timer.setInterval(interval_ms)
+        self._timer.timeout.connect(self._beat)
+
+        self.logger = logging.getLogger(STALL_LOGGER)
+        self.logger.propagate = False
+        if log_path is not None and not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                           encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+
+    def start(self):
+        self._last_beat = time.monotonic()
+        self._timer.start()
+        self._helper.start()
+
+    def stop(self):
+        self._timer.stop()
+        self._stopped.set()
+
+    def _beat(self):
+        now = time.monotonic()
+        delay = max(now - self._last_beat - self.interval, 0.0)
+        bucket = bisect.bisect_left(DELAY_BUCKETS, delay)
+        self.delay_counts[bucket] += 1
+        with self._lock:
+            self._last_beat = now
+            stack, self._captured_stack = self._captured_stack, None
+        if delay >= self.threshold:
+            self.stall_counts[bucket] += 1
+            stall = Stall(datetime.datetime.now() - datetime.timedelta(seconds=delay), delay, stack)
+            self.stalls.append(stall)
+            self.logger.info("Event loop stalled for %.2f s\n%s", delay,
+                             ''.join(stack) if stack else "  (stack not captured)")
+
+    def _watch(self):
+        """Runs on the helper thread; only reads the heartbeat and the GUI thread's frames."""
+        while not self._stopped.wait(self.interval / 2):
+            with self._lock:
+                overdue = time.monotonic() - self._last_beat - self.interval
+                if overdue < self.threshold or self._captured_stack is not None:
+                    continue
+                frame = sys._current_frames().get(self.gui_thread_id)
+                self._captured_stack = traceback.format_stack(frame) if frame is not None else []
+
+
+class StallDiagnosticsDialog(QDialog):
+    """Shows the watchdog's delay histograms and the recorded stalls with their stacks."""
+
+    def __init__(self, watchdog, parent=None):
+        super().__init__(parent)
+        self.watchdog = watchdog
+        self.setWindowTitle("Diagnostics")
+        self.setGeometry(300, 300, 900, 650)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel(f"Event-loop delay (heartbeat every {watchdog.interval * 1000:.0f} ms, "
+                                f"stalls from {watchdog.threshold * 1000:.0f} ms)"))
+        self.histogram = QTableWidget(len(DELAY_BUCKETS) + 1, 3, self)
+        self.histogram.setHorizontalHeaderLabels(["Heartbeats", "Stalls", ""])
+        self.histogram.setVerticalHeaderLabels(bucket_labels())
+        self.histogram.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.histogram.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.histogram)
+
+        splitter = QSplitter(Qt.Vertical, self)
+        self.stall_list = QListWidget(splitter)
+        self.stack_view = QPlainTextEdit(splitter)
+        self.stack_view.setReadOnly(True)
+        self.stack_view.setFont(QFont("Courier New", 9))
+        self.stall_list.currentRowChanged.connect(self.show_stack)
+        layout.addWidget(QLabel("Recorded stalls, newest first"))
+        layout.addWidget(splitter)
+
+        button_layout = QHBoxLayout()
+        refresh_button = QPushButton("Refresh", self)
+        refresh_button.clicked.connect(self.refresh)
+        button_layout.addStretch()
+        button_layout.addWidget(refresh_button)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+        self.refresh()
+
+    def refresh(self):
+        delay_counts = list(self.watchdog.delay_counts)
+        stall_counts = list(self.watchdog.stall_counts)
+        largest = max(delay_counts) or 1
+        for row, (beats, stalls) in enumerate(zip(delay_counts, stall_counts)):
+            self.histogram.setItem(row, 0, QTableWidgetItem(str(beats)))
+            self.histogram.setItem(row, 1, QTableWidgetItem(str(stalls)))
+            # Bars are drawn on a log scale, or the normal heartbeats would flatten the rest
+            width = round(40 * math.log1p(beats) / math.log1p(largest))
+            self.histogram.setItem(row, 2, QTableWidgetItem("█" * width))
+
+        self.stalls = list(reversed(self.watchdog.stalls))
+        self.stall_list.clear()
+        self.stall_list.addItems([stall.summary() for stall in self.stalls])
+        self.stack_view.clear()
+        if self.stalls:
+            self.stall_list.setCurrentRow(0)
+
+    def show_stack(self, row):
+        if 0 <= row < len(self.stalls):
+            stack = self.stalls[row].stack
+            self.stack_view.setPlainText(''.join(stack) if stack else "The stack was not captured for this stall.")
@@ -0,0 +1,577 @@
+import ast
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+import pandas as pd
+from excel_export import write_sheet
+from tracing import tracer
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    category TEXT NOT NULL,
+    image_path TEXT,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS models (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL REFERENCES products(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    price REAL NOT NULL DEFAULT 0,
+    fee REAL NOT NULL DEFAULT 0,
+    units_sold INTEGER,
+    UNIQUE (product_id, name)
+);
+CREATE TABLE IF NOT EXISTS colors (
+    model_id INTEGER NOT NULL REFERENCES models(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    stock INTEGER,
+    units_sold INTEGER,
+    PRIMARY KEY (model_id, name)
+);
+CREATE TABLE IF NOT EXISTS changes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id INTEGER NOT NULL,
+    terminal TEXT NOT NULL,
+    changed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS journals (
+    name TEXT PRIMARY KEY,
+    applied INTEGER NOT NULL
+);
+"""
+CHANGE_RETENTION = 24 * 60 * 60  # Seconds; a terminal that has not polled for this long reloads everything
+ID_BATCH = 500  # Ids per IN (...) query, well under SQLite's parameter limit
+
+
+class ConflictError(RuntimeError):
+    """Raised when a conditional write finds that another terminal changed the product first.
+
+    ``available`` is the stock left when a sale did not fit, otherwise None.
+    """
+
+    def __init__(self, message, product_id, available=None):
+        super().__init__(message)
+        self.product_id = product_id
+        self.available = available
+
+
+
+class InventoryStore:
+    """Keeps products, models and color stock as rows in a single SQLite file.
+
+    A NULL ``units_sold`` means the matching 'Units Sold' key is absent from the
+    product's Data dict, and a NULL ``stock`` marks a color that only exists in
+    'Units Sold Colors'. The store may be shared between threads. Writes go
+    through one connection and hold the store's lock for their transaction;
+    reads go through a second connection with a lock of its own, so they see
+    the last commit without waiting for a write transaction to finish. Reads
+    made inside the calling thread's own write transaction use the writing
+    connection and see its changes.
+
+    The database runs in WAL mode with full synchronous commits: a commit is
+    durable once it returns, and an interrupted one is rolled back by SQLite
+    the next time the file is opened.
+
+    Several terminals may share the file. Stock changes are deltas, and sales
+    only apply while enough stock is left, so concurrent writes never
+    overwrite each other. Every write bumps the product's ``version`` (which
+    whole-product edits can compare against) and adds a row to ``changes``
+    naming the product and the writing ``terminal``, so other terminals can
+    reload just the products that changed.
+
+    Sales and refunds are journaled in ``order_transaction``, which stores how
+    far the order journal's stock changes have been applied in the same
+    commit as the changes themselves.
+    """
+
+    def __init__(self, path, terminal=None):
+        self.path = path
+        self.terminal = terminal or uuid.uuid4().hex
+        self.connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = FULL")
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._writer = None  # Thread running the write transaction
+        self.reader = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._read_lock = threading.RLock()
+        self._read_depth = 0
+        with self.transaction() as connection:
+            # Databases created before versions were tracked
+            if 'version' not in [row[1] for row in connection.execute("PRAGMA table_info(products)")]:
+                connection.execute("ALTER TABLE products ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            connection.execute("DELETE FROM changes WHERE changed_at < ?", (time.time() - CHANGE_RETENTION,))
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+
+    @contextmanager
+    def transaction(self):
+        with self._lock:
+            # Nested calls run in a savepoint of the outermost transaction, so a
+            # failing inner block is undone without losing the rest of the batch
+            if self._depth:
+                savepoint = f"nested_{self._depth}"
+                self._depth += 1
+                self.connection.execute(f"SAVEPOINT {savepoint}")
+                try:
+                    yield self.connection
+                    self.connection.execute(f"RELEASE {savepoint}")
+                except BaseException:
+                    self.connection.execute(f"ROLLBACK TO {savepoint}")
+                    self.connection.execute(f"RELEASE {savepoint}")
+                    raise
+                finally:
+                    self._depth -= 1
+                return
+
+            self._depth = 1
+            self._writer = threading.get_ident()
+            self.connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.connection
+                self.connection.execute("COMMIT")
+            except BaseException:
+                self.connection.execute("ROLLBACK")
+                raise
+            finally:
+                self._depth = 0
+                self._writer = None
+
+    @contextmanager
+    def reading(self):
+        """Yields a connection for reads that all see the same committed state.
+
+        Inside this thread's write transaction that is the writing connection;
+        otherwise it is the read connection, which never waits for writers.
+        """
+        if self._writer == threading.get_ident():
+            yield self.connection
+            return
+        with self._read_lock:
+            if self._read_depth:
+                self._read_depth += 1
+                try:
+                    yield self.reader
+                finally:
+                    self._read_depth -= 1
+                return
+
+            self._read_depth = 1
+            self.reader.execute("BEGIN")
+            try:
+                yield self.reader
+            finally:
+                self.reader.execute("COMMIT")
+                self._read_depth = 0
+
+    @contextmanager
+    def order_transaction(self, journal):
+        """A transaction for stock changes whose order records are appended to ``journal`` inside it.
+
+        The journal is fsynced before COMMIT, and the end of the file is
+        stored with the stock changes, so orders past the stored offset are
+        exactly those whose transaction never committed. Every order
+        transaction, in any process, first replays their stock changes. All
+        writers append under the database's write lock, so nobody else can be
+        in the middle of writing them.
+        """
+        name = os.path.basename(journal.path)
+        with self.transaction() as connection:
+            size = journal.size()
+            # A journal seen for the first time only holds orders from before offsets were kept
+            connection.execute("INSERT OR IGNORE INTO journals (name, applied) VALUES (?, ?)", (name, size))
+            applied, = connection.execute("SELECT applied FROM journals WHERE name = ?", (name,)).fetchone()
+            if applied < size:
+                journal.repair()
+                self._replay_orders(journal.read_from(applied), name)
+            yield connection
+            journal.sync()
+            connection.execute("UPDATE journals SET applied = ? WHERE name = ?", (journal.size(), name))
+
+    def replay_orders(self, journal):
+        """Applies the stock changes of orders a crash left in ``journal`` but not in the database."""
+        with self.order_transaction(journal):
+            pass
+
+    def _replay_orders(self, records, name):
+        replayed = 0
+        for record in records:
+            product_id = record.get('Product ID')
+            if product_id is None:
+                continue  # Imported or written before orders carried their product
+            quantity = abs(int(record['Quantity']))
+            try:
+                if record.get('Status') == 'REFUNDED':
+                    self.refund(product_id, record['Model'], record['Color'], quantity)
+                else:
+                    self.adjust_stock(product_id, record['Model'], record['Color'], -quantity, sold=quantity)
+            except KeyError as e:
+                print(f"Skipped replaying order {record.get('Order Name')!r}: {e}")
+                continue
+            replayed += 1
+        if replayed:
+            print(f"Replayed the stock changes of {replayed} order(s) from {name} that a crash kept from the database")
+
+    def is_empty(self):
+        with self.reading() as connection:
+            return connection.execute("SELECT 1 FROM products LIMIT 1").fetchone() is None
+
+    def load_products(self, product_ids=None):
+        """Returns a list of (product id, item name, category, data, image path) tuples.
+
+        With ``product_ids`` only those products are read; ids that no longer
+        exist are left out.
+        """
+        with tracer.span("sqlite load products") as span, self.reading() as connection:
+            if product_ids is None:
+                products = self._load_products(connection)
+            else:
+                product_ids = sorted(int(product_id) for product_id in product_ids)
+                products = []
+                for start in range(0, len(product_ids), ID_BATCH):
+                    products.extend(self._load_products(connection, product_ids[start:start + ID_BATCH]))
+            span.set(rows=len(products))
+            return products
+
+    def _load_products(self, connection, product_ids=None):
+        if product_ids is None:
+            product_filter = model_filter = color_filter = ""
+            parameters = ()
+        else:
+            placeholders = ', '.join('?' * len(product_ids))
+            product_filter = f"WHERE id IN ({placeholders})"
+            model_filter = f"WHERE product_id IN ({placeholders})"
+            color_filter = f"WHERE model_id IN (SELECT id FROM models WHERE product_id IN ({placeholders}))"
+            parameters = product_ids
+
+        products = {}
+        for product_id, name, category, image_path in connection.execute(
+                f"SELECT id, name, category, image_path FROM products {product_filter} ORDER BY id", parameters):
+            products[product_id] = (name, category, {}, image_path)
+
+        models = {}
+        for model_id, product_id, name, price, fee, units_sold in connection.execute(
+                f"SELECT id, product_id, name, price, fee, units_sold FROM models {model_filter} ORDER BY product_id, position", parameters):
+            model_data = {'Price': price, 'Fee': fee, 'Colors': {}}
+            if units_sold is not None:
+                model_data['Units Sold'] = units_sold
+            products[product_id][2][name] = model_data
+            models[model_id] = model_data
+
+        for model_id, name, stock, units_sold in connection.execute(
+                f"SELECT model_id, name, stock, units_sold FROM colors {color_filter} ORDER BY model_id, position", parameters):
+            model_data = models[model_id]
+            if stock is not None:
+                model_data['Colors'][name] = stock
+            if units_sold is not None:
+                model_data.setdefault('Units Sold Colors', {})[name] = units_sold
+
+        return [(product_id, name, category, data, image_path)
+                for product_id, (name, category, data, image_path) in products.items()]
+
+    def add_product(self, item_name, category, data, image_path):
+        with self.transaction() as connection:
+            cursor = connection.execute(
+                "INSERT INTO products (name, category, image_path) VALUES (?, ?, ?)",
+                (item_name, category, image_path))
+            product_id = cursor.lastrowid
+            self._insert_models(product_id, data)
+            self._record_changes([product_id])
+        return product_id
+
+    def update_product(self, product_id, item_name, category, data, image_path, expected_version=None):
+        """Replaces a product's details and models.
+
+        With ``expected_version`` the product is only replaced if nobody has
+        changed it since that version was read; otherwise ConflictError.
+        """
+        product_id = int(product_id)
+        with self.transaction() as connection:
+            if expected_version is None:
+                connection.execute(
+                    "UPDATE products SET name = ?, category = ?, image_path = ? WHERE id = ?",
+                    (item_name, category, image_path, product_id))
+            elif not connection.execute(
+                    "UPDATE products SET name = ?, category = ?, image_path = ? WHERE id = ? AND version = ?",
+                    (item_name, category, image_path, product_id, expected_version)).rowcount:
+                raise ConflictError(f"Product {product_id} was changed by another terminal", product_id)
+            connection.execute("DELETE FROM models WHERE product_id = ?", (product_id,))
+            self._insert_models(product_id, data)
+            self._record_changes([product_id])
+
+    def edit_product(self, product_id, item_name, category, image_path, models, expected_version=None):
+        """Writes an edit form: the product's details and its models' names, prices, fees and colors.
+
+        ``models`` lists (original model, model, price, fee, colors) in form
+        order, and colors are (original color, color, shown stock, stock);
+        originals are None for rows added in the form. Stock moves by the
+        difference between what the form showed and what was entered, so
+        sales made meanwhile are kept, and units sold counters are left alone.
+        Models left out of the form are deleted, and so are colors, except
+        that a color with units sold stays behind without stock.
+        ``expected_version`` works as in ``update_product``.
+        """
+        product_id = int(product_id)
+        with self.transaction() as connection:
+            if expected_version is None:
+                connection.execute(
+                    "UPDATE products SET name = ?, category = ?, image_path = ? WHERE id = ?",
+                    (item_name, category, image_path, product_id))
+            elif not connection.execute(
+                    "UPDATE products SET name = ?, category = ?, image_path = ? WHERE id = ? AND version = ?",
+                    (item_name, category, image_path, product_id, expected_version)).rowcount:
+                raise ConflictError(f"Product {product_id} was changed by another terminal", product_id)
+
+            existing = dict(connection.execute("SELECT name, id FROM models WHERE product_id = ?", (product_id,)))
+            kept = {original for original, *_ in models if original in existing}
+            connection.executemany("DELETE FROM models WHERE id = ?",
+                                   [(model_id,) for model, model_id in existing.items() if model not in kept])
+            # Kept rows take temporary names first, so renames can swap names without a clash
+            connection.executemany("UPDATE models SET name = ? WHERE id = ?",
+                                   [(f"\0{model_id}", model_id) for model, model_id in existing.items() if model in kept])
+            for position, (original, model, price, fee, colors) in enumerate(models):
+                if original in kept:
+                    model_id = existing[original]
+                    connection.execute("UPDATE models SET name = ?, position = ?, price = ?, fee = ? WHERE id = ?",
+                                       (model, position, float(price), float(fee or 0.0), model_id))
+                else:
+                    model_id = connection.execute(
+                        "INSERT INTO models (product_id, position, name, price, fee) VALUES (?, ?, ?, ?, ?)",
+                        (product_id, position, model, float(price), float(fee or 0.0))).lastrowid
+                self._edit_colors(model_id, colors)
+            self._record_changes([product_id])
+
+    def _edit_colors(self, model_id, colors):
+        existing = {name for name, in self.connection.execute(
+            "SELECT name FROM colors WHERE model_id = ? AND stock IS NOT NULL", (model_id,))}
+        kept = {original for original, *_ in colors if original in existing}
+        removed = [(model_id, name) for name in existing - kept]
+        self.connection.executemany("DELETE FROM colors WHERE model_id = ? AND name = ? AND units_sold IS NULL", removed)
+        self.connection.executemany("UPDATE colors SET stock = NULL WHERE model_id = ? AND name = ?", removed)
+        self.connection.executemany("UPDATE colors SET name = ? WHERE model_id = ? AND name = ?",
+                                    [(f"\0{name}", model_id, name) for name in kept])
+        for position, (original, color, shown, stock) in enumerate(colors):
+            if original in kept:
+                self.connection.execute(
+                    "UPDATE colors SET name = ?, position = ?, stock = MAX(stock + ?, 0) WHERE model_id = ? AND name = ?",
+                    (color, position, stock - shown, model_id, f"\0{original}"))
+            else:
+                # A color that only had units sold gets its stock back
+                self.connection.execute(
+                    "INSERT INTO colors (model_id, position, name, stock) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (model_id, name) DO UPDATE SET position = excluded.position, stock = COALESCE(stock, 0) + excluded.stock",
+                    (model_id, position, color, stock))
+
+    def remove_product(self, product_id):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM products WHERE id = ?", (int(product_id),))
+            self._record_changes([int(product_id)])
+
+    def adjust_stock(self, product_id, model, color, delta, sold=0):
+        """Adds ``delta`` to one color's stock and ``sold`` to its units sold counters."""
+        with self.transaction() as connection:
+            model_id = self._model_id(product_id, model)
+            if sold:
+                connection.execute(
+                    "UPDATE models SET units_sold = COALESCE(units_sold, 0) + ? WHERE id = ?",
+                    (sold, model_id))
+                connection.execute(
+                    "UPDATE colors SET stock = stock + ?, units_sold = COALESCE(units_sold, 0) + ? "
+                    "WHERE model_id = ? AND name = ?",
+                    (delta, sold, model_id, color))
+            else:
+                connection.execute(
+                    "UPDATE colors SET stock = stock + ? WHERE model_id = ? AND name = ?",
+                    (delta, model_id, color))
+            self._record_changes([int(product_id)])
+
+    def sell(self, product_id, model, color, quantity):
+        """Takes sold units off one color's stock, as ``apply_sale`` does in memory.
+
+        The stock is compared and decremented in one statement, so of two
+        terminals selling the last units only one succeeds; the other gets a
+        ConflictError carrying the stock that is left.
+        """
+        product_id = int(product_id)
+        with self.transaction() as connection:
+            model_id = self._model_id(product_id, model)
+            if not connection.execute(
+                    "UPDATE colors SET stock = stock - ?, units_sold = COALESCE(units_sold, 0) + ? "
+                    "WHERE model_id = ? AND name = ? AND stock >= ?",
+                    (quantity, quantity, model_id, color, quantity)).rowcount:
+                row = connection.execute("SELECT stock FROM colors WHERE model_id = ? AND name = ?", (model_id, color)).fetchone()
+                available = row[0] if row is not None else 0
+                raise ConflictError(f"Only {available} left of {model} ({color})", product_id, available)
+            connection.execute("UPDATE models SET units_sold = COALESCE(units_sold, 0) + ? WHERE id = ?", (quantity, model_id))
+            self._record_changes([product_id])
+
+    def refund(self, product_id, model, color, quantity):
+        """Puts refunded units back in stock and takes them off the counters, as ``apply_refund`` does in memory."""
+        product_id = int(product_id)
+        with self.transaction() as connection:
+            model_id = self._model_id(product_id, model)
+            connection.execute("UPDATE colors SET stock = stock + ? WHERE model_id = ? AND name = ?", (quantity, model_id, color))
+            if connection.execute(
+                    "UPDATE colors SET units_sold = MAX(units_sold - ?, 0) WHERE model_id = ? AND name = ? AND units_sold IS NOT NULL",
+                    (quantity, model_id, color)).rowcount:
+                connection.execute("UPDATE models SET units_sold = MAX(COALESCE(units_sold, 0) - ?, 0) WHERE id = ?", (quantity, model_id))
+            self._record_changes([product_id])
+
+    def add_stock_many(self, rows):
+        """Adds (product id, model, color, quantity) increments in one transaction."""
+        rows = [(int(product_id), model, color, quantity) for product_id, model, color, quantity in rows]
+        with self.transaction() as connection:
+            connection.executemany(
+                "UPDATE colors SET stock = stock + ? "
+                "WHERE name = ? AND model_id = (SELECT id FROM models WHERE product_id = ? AND name = ?)",
+                [(quantity, color, product_id, model) for product_id, model, color, quantity in rows])
+            self._record_changes({product_id for product_id, _, _, _ in rows})
+
+    def set_stock(self, product_id, model, color, stock, units_sold=None, model_units_sold=None):
+        """Writes one color's current stock and units sold counters.
+
+        Writing absolute values keeps repeated writes of the same color
+        idempotent, so queued writes can be coalesced.
+        """
+        product_id = int(product_id)
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE colors SET stock = ?, units_sold = ? "
+                "WHERE name = ? AND model_id = (SELECT id FROM models WHERE product_id = ? AND name = ?)",
+                (stock, units_sold, color, product_id, model))
+            connection.execute(
+                "UPDATE models SET units_sold = ? WHERE product_id = ? AND name = ?",
+                (model_units_sold, product_id, model))
+            self._record_changes([product_id])
+
+    def set_stock_many(self, rows):
+        """Writes (product id, model, color, stock, units sold, model units sold) rows in one transaction."""
+        rows = [(int(product_id), model, color, stock, units_sold, model_units_sold)
+                for product_id, model, color, stock, units_sold, model_units_sold in rows]
+        with self.transaction() as connection:
+            connection.executemany(
+                "UPDATE colors SET stock = ?, units_sold = ? "
+                "WHERE name = ? AND model_id = (SELECT id FROM models WHERE product_id = ? AND name = ?)",
+                [(stock, units_sold, color, product_id, model)
+                 for product_id, model, color, stock, units_sold, _ in rows])
+            connection.executemany(
+                "UPDATE models SET units_sold = ? WHERE product_id = ? AND name = ?",
+                [(model_units_sold, product_id, model)
+                 for product_id, model, _, _, _, model_units_sold in rows])
+            self._record_changes({product_id for product_id, *_ in rows})
+
+    def versions(self, product_ids=None):
+        """Returns {product id: version}, for every product or only for ``product_ids``."""
+        with self.reading() as connection:
+            if product_ids is None:
+                return dict(connection.execute("SELECT id, version FROM products"))
+            product_ids = sorted(int(product_id) for product_id in product_ids)
+            versions = {}
+            for start in range(0, len(product_ids), ID_BATCH):
+                batch = product_ids[start:start + ID_BATCH]
+                versions.update(connection.execute(
+                    f"SELECT id, version FROM products WHERE id IN ({', '.join('?' * len(batch))})", batch))
+            return versions
+
+    def data_version(self):
+        """Returns a number that changes whenever the database is committed to, by this store or anyone else."""
+        with self.reading() as connection:
+            return connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def last_change(self):
+        with self.reading() as connection:
+            return connection.execute("SELECT COALESCE(MAX(id), 0) FROM changes").fetchone()[0]
+
+    def changes_since(self, change_id):
+        """Returns (last change id, ids of products changed by other terminals after ``change_id``).
+
+        The ids are None if changes after ``change_id`` have already been
+        pruned, in which case everything has to be reloaded.
+        """
+        with self.reading() as connection:
+            oldest = connection.execute("SELECT MIN(id) FROM changes").fetchone()[0]
+            rows = connection.execute("SELECT id, product_id, terminal FROM changes WHERE id > ? ORDER BY id", (change_id,)).fetchall()
+        if not rows:
+            return change_id, set()
+        if oldest > change_id + 1:
+            return rows[-1][0], None
+        return rows[-1][0], {product_id for _, product_id, terminal in rows if terminal != self.terminal}
+
+    def _record_changes(self, product_ids):
+        now = time.time()
+        self.connection.executemany("UPDATE products SET version = version + 1 WHERE id = ?", [(product_id,) for product_id in product_ids])
+        self.connection.executemany("INSERT INTO changes (product_id, terminal, changed_at) VALUES (?, ?, ?)",
+                                    [(product_id, self.terminal, now) for product_id in product_ids])
+
+    def _model_id(self, product_id, model):
+        row = self.connection.execute(
+            "SELECT id FROM models WHERE product_id = ? AND name = ?", (int(product_id), model)).fetchone()
+        if row is None:
+            raise KeyError(f"Unknown model {model!r} for product {product_id}")
+        return row[0]
+
+    def _insert_models(self, product_id, data):
+        for model_position, (model, model_data) in enumerate(data.items()):
+            cursor = self.connection.execute(
+                "INSERT INTO models (product_id, position, name, price, fee, units_sold) VALUES (?, ?, ?, ?, ?, ?)",
+                (product_id, model_position, model, float(model_data.get('Price', 0.0)),
+                 float(model_data.get('Fee', 0.0) or 0.0), model_data.get('Units Sold')))
+            model_id = cursor.lastrowid
+
+            stock = model_data.get('Colors', {})
+            units_sold = model_data.get('Units Sold Colors', {})
+            colors = list(stock) + [color for color in units_sold if color not in stock]
+            self.connection.executemany(
+                "INSERT INTO colors (model_id, position, name, stock, units_sold) VALUES (?, ?, ?, ?, ?)",
+                [(model_id, color_position, color, stock.get(color), units_sold.get(color))
+                 for color_position, color in enumerate(colors)])
+
+    def import_products(self, products):
+        """Bulk loads (item name, category, data, image path) tuples in one transaction."""
+        with self.transaction():
+            return [self.add_product(*product) for product in products]
+
+    def export_excel(self, path):
+        rows = [[name, category, json.dumps(data), image_path]
+                for _, name, category, data, image_path in self.load_products()]
+        write_sheet(path, pd.DataFrame(rows, columns=['Item Name', 'Category', 'Data', 'Image Path']))
+
+
+def parse_product_data(text):
+    """Parses a workbook Data cell without evaluating it as code.
+
+    Exports hold JSON; workbooks written by older versions hold the Python
+    repr of the dict, which ``ast.literal_eval`` reads safely.
+    """
+    if not isinstance(text, str):
+        return {}
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
+
+def migrate_from_excel(store, excel_path, normalize_data):
+    """One-time import of a legacy inventory workbook into an empty store."""
+    if not os.path.exists(excel_path) or not store.is_empty():
+        return False
+
+    legacy_df = pd.read_excel(excel_path)
+    products = []
+    for _, row in legacy_df.iterrows():
+        image_path = row['Image Path'] if isinstance(row['Image Path'], str) else None
+        products.append((row['Item Name'], row['Category'], normalize_data(parse_product_data(row['Data'])), image_path))
+    store.import_products(products)
+    return True
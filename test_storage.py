@@ -0,0 +1,68 @@
+import os
+import shutil
+import tempfile
+import unittest
+from storage import ConflictError, InventoryStore
+from sales import apply_edit, unchanged_models
+
+
+class EditProductTest(unittest.TestCase):
+    """Edits from two tills sharing one database, each with its own connection."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'inventory.db')
+        self.till_a = InventoryStore(path)
+        self.till_b = InventoryStore(path)
+        self.product_id = self.till_a.add_product("Clear Case", "Cases", {
+            'iPhone 13': {'Price': 10.0, 'Fee': 1.0, 'Colors': {'Black': 5, 'Blue': 3}},
+            'iPhone 14': {'Price': 12.0, 'Fee': 1.0, 'Colors': {'Black': 4}},
+        }, None)
+
+    def tearDown(self):
+        self.till_a.close()
+        self.till_b.close()
+        shutil.rmtree(self.directory)
+
+    def data(self):
+        return self.till_b.load_products([self.product_id])[0][3]
+
+    def test_edit_with_version_read_before_a_sale_conflicts(self):
+        version = self.till_b.versions([self.product_id])[self.product_id]
+        models = unchanged_models(self.data())
+        self.till_a.sell(self.product_id, 'iPhone 13', 'Black', 2)
+
+        with self.assertRaises(ConflictError):
+            self.till_b.edit_product(self.product_id, "Clear Case", "Cases", None, models, expected_version=version)
+        self.assertEqual(self.data()['iPhone 13']['Colors']['Black'], 3)
+
+    def test_edit_moves_stock_by_the_difference_from_what_was_shown(self):
+        models = unchanged_models(self.data())
+        self.till_a.sell(self.product_id, 'iPhone 13', 'Black', 2)
+
+        # Restock Black by 10 and rename the model, while the form still shows 5
+        original, _, price, fee, colors = models[0]
+        colors = [('Black', 'Black', 5, 15)] + colors[1:]
+        self.till_b.edit_product(self.product_id, "Clear Case", "Cases", None, [(original, 'iPhone 13 Mini', 11.0, fee, colors)] + models[1:])
+
+        model_data = self.data()['iPhone 13 Mini']
+        self.assertEqual(model_data['Colors'], {'Black': 13, 'Blue': 3})
+        self.assertEqual((model_data['Price'], model_data['Units Sold'], model_data['Units Sold Colors']), (11.0, 2, {'Black': 2}))
+
+    def test_edit_swaps_names_and_keeps_the_sales_of_removed_colors(self):
+        self.till_a.sell(self.product_id, 'iPhone 13', 'Blue', 1)
+        data = self.data()
+        thirteen, fourteen = unchanged_models(data)
+        edits = [('iPhone 14', 'iPhone 13', 12.0, 1.0, fourteen[4]),
+                 ('iPhone 13', 'iPhone 14', 10.0, 1.0, [('Black', 'Black', 5, 5)])]
+        self.till_b.edit_product(self.product_id, "Clear Case", "Cases", None, edits)
+        apply_edit(data, edits)
+
+        stored = self.data()
+        self.assertEqual(stored, data)
+        self.assertEqual(stored['iPhone 14']['Colors'], {'Black': 5})
+        self.assertEqual(stored['iPhone 14']['Units Sold Colors'], {'Blue': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
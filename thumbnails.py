@@ -0,0 +1,161 @@
+import hashlib
+import os
+from collections import OrderedDict
+from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+def thumbnail_key(image_path):
+    """Returns (path, mtime) for an existing image, or None."""
+    try:
+        return (os.path.abspath(image_path), os.stat(image_path).st_mtime_ns)
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+class ThumbnailCache:
+    """Scaled product images in a byte-bounded in-memory LRU, backed by PNG files on disk.
+
+    Entries are keyed by path and mtime, so replacing an image invalidates its
+    thumbnail without any bookkeeping.
+    """
+
+    def __init__(self, directory='thumbnails', size=150, max_bytes=64 * 1024 * 1024):
+        self.directory = directory
+        self.size = size
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._pixmaps = OrderedDict()
+
+    def get(self, image_path):
+        key = thumbnail_key(image_path)
+        if key is None:
+            return None
+        pixmap = self.lookup(key)
+        if pixmap is None:
+            pixmap = self.insert(key, self.load_image(key))
+        return pixmap
+
+    def lookup(self, key):
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+        return pixmap
+
+    def insert(self, key, image):
+        if image is None or image.isNull():
+            return None
+        pixmap = QPixmap.fromImage(image)
+        if key in self._pixmaps:
+            self.used_bytes -= self._pixmap_bytes(self._pixmaps.pop(key))
+        self._pixmaps[key] = pixmap
+        self.used_bytes += self._pixmap_bytes(pixmap)
+        while self.used_bytes > self.max_bytes and len(self._pixmaps) > 1:
+            _, evicted = self._pixmaps.popitem(last=False)
+            self.used_bytes -= self._pixmap_bytes(evicted)
+        return pixmap
+
+    def load_image(self, key):
+        """Returns the scaled QImage for a key, decoding the source only on a disk miss.
+
+        Only uses QImage, so it is safe to call off the GUI thread.
+        """
+        thumbnail_path = self.thumbnail_path(key)
+        image = QImage(thumbnail_path)
+        if not image.isNull():
+            return image
+
+        image = QImage(key[0])
+        if image.isNull():
+            return image
+        image = image.scaled(self.size, self.size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            image.save(thumbnail_path, 'PNG')
+        except OSError as e:
+            print(f"Error saving thumbnail: {e}")
+        return image
+
+    def thumbnail_path(self, key):
+        digest = hashlib.sha1(f"{key[0]}|{key[1]}|{self.size}".encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, f"{digest}.png")
+
+    def _pixmap_bytes(self, pixmap):
+        return pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+
+
+class _DecodeSignals(QObject):
+    finished = pyqtSignal(object, object, object)
+
+
+class _DecodeTask(QRunnable):
+    def __init__(self, cache, key, signals):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.cache = cache
+        self.key = key
+        self.signals = signals
+        self.cancelled = False
+
+    def run(self):
+        image = None
+        if not self.cancelled:
+            try:
+                image = self.cache.load_image(self.key)
+            except Exception as e:
+                print(f"Error decoding thumbnail: {e}")
+        self.signals.finished.emit(self.key, image, self)
+
+
+class ThumbnailLoader(QObject):
+    """Decodes thumbnails on a worker pool and hands back pixmaps on the GUI thread.
+
+    ``request`` never blocks: it returns the cached pixmap, or None after
+    queueing a decode, and ``thumbnail_ready`` fires once the image arrives.
+    """
+
+    thumbnail_ready = pyqtSignal(str)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self.pool = QThreadPool(self)
+        self._pending = {}
+        self._cancelled = set()  # Started before being cancelled, kept alive until they finish
+        self._failed = set()
+        self._signals = _DecodeSignals(self)
+        self._signals.finished.connect(self._on_finished)
+
+    def request(self, image_path):
+        key = thumbnail_key(image_path)
+        if key is None or key in self._failed:
+            return None
+        pixmap = self.cache.lookup(key)
+        if pixmap is None and key not in self._pending:
+            task = _DecodeTask(self.cache, key, self._signals)
+            self._pending[key] = task
+            self.pool.start(task)
+        return pixmap
+
+    def retain(self, image_paths):
+        """Cancels pending decodes for images that are no longer visible."""
+        keep = {thumbnail_key(image_path) for image_path in image_paths}
+        for key, task in list(self._pending.items()):
+            if key not in keep:
+                task.cancelled = True
+                if not self.pool.tryTake(task):
+                    self._cancelled.add(task)
+                del self._pending[key]
+
+    def wait(self):
+        self.pool.waitForDone()
+
+    def _on_finished(self, key, image, task):
+        if task.cancelled:
+            self._cancelled.discard(task)
+            return
+        del self._pending[key]
+        if self.cache.insert(key, image) is None:
+            self._failed.add(key)
+        else:
+            self.thumbnail_ready.emit(key[0])
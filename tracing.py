@@ -0,0 +1,165 @@
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from functools import wraps
+from inspect import CO_VARARGS
+
+SLOW_ACTION_LOGGER = 'invman.slow_actions'
+LOG_MAX_BYTES = 1024 * 1024
+LOG_BACKUPS = 3
+
+
+class Span:
+    """One timed step of an action, with its nested steps in ``children``."""
+
+    __slots__ = ('tracer', 'name', 'attributes', 'children', 'started', 'duration')
+
+    def __init__(self, tracer, name, attributes):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.children = []
+        self.started = None
+        self.duration = None
+
+    def set(self, **attributes):
+        """Attaches counts such as ``rows=len(df)`` to the span."""
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if stack:
+            stack[-1].children.append(self)
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.duration = time.perf_counter() - self.started
+        stack = self.tracer._stack()
+        stack.pop()
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        if not stack:
+            self.tracer._finish(self)
+        return False
+
+    def lines(self, depth=0):
+        details = ''.join(f" {key}={value}" for key, value in self.attributes.items())
+        yield f"{'  ' * depth}{self.name} {self.duration * 1000:.1f} ms{details}"
+        for child in self.children:
+            yield from child.lines(depth + 1)
+
+
+class _DisabledSpan:
+    """Stands in for every span while tracing is off, so a disabled span costs one call."""
+
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+DISABLED_SPAN = _DisabledSpan()
+
+
+class Tracer:
+    """Times user actions as trees of nested spans.
+
+    A span opened while no other span is open on its thread is an action;
+    when an action takes longer than the threshold, it is written to the
+    slow-action log with the duration and attributes of every nested step.
+    Each thread keeps its own stack, so work on the persistence worker or
+    the order loader shows up as actions of its own.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.threshold = 0.5
+        self.logger = logging.getLogger(SLOW_ACTION_LOGGER)
+        self.logger.propagate = False
+        self._local = threading.local()
+
+    def configure(self, log_path, threshold_ms=500, enabled=True):
+        """Turns tracing on or off and sends slow actions to a rotating log at ``log_path``."""
+        self.enabled = enabled
+        self.threshold = threshold_ms / 1000
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
+        if enabled:
+            handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS,
+                                                           encoding='utf-8', delay=True)
+            handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+            self.logger.addHandler(handler)
+            self.logger.setLevel(logging.INFO)
+
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return DISABLED_SPAN
+        return Span(self, name, attributes)
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            self._local.stack = []
+            return self._local.stack
+
+    def _finish(self, span):
+        if span.duration >= self.threshold:
+            self.logger.info("Slow action %s (%.1f ms, thread %s)\n%s", span.name, span.duration * 1000,
+                             threading.current_thread().name, '\n'.join(span.lines(1)))
+
+
+tracer = Tracer()
+
+
+def traced(name=None):
+    """Runs the decorated function inside a span named ``name`` (the function's name by default).
+
+    Qt signals pass arguments, like clicked's checked flag, that PyQt drops
+    when a slot does not take them; the wrapper hides the slot's signature
+    from PyQt, so it drops them itself.
+    """
+    def decorate(function):
+        label = name or function.__name__
+        code = function.__code__
+        positional = None if code.co_flags & CO_VARARGS else code.co_argcount
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            args = args[:positional]
+            if not tracer.enabled:
+                return function(*args, **kwargs)
+            with Span(tracer, label, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def milliseconds_from_env(name, default):
+    """Reads a duration in milliseconds, such as ``750`` or ``750ms``, from the environment variable ``name``.
+
+    An unset variable gives ``default``; a value that is not a number of
+    milliseconds is reported and ``default`` is used instead of failing at startup.
+    """
+    text = os.environ.get(name, '').strip()
+    if not text:
+        return default
+    try:
+        value = float(text[:-2] if text.lower().endswith('ms') else text)
+    except ValueError:
+        value = None
+    if value is None or not 0 <= value < float('inf'):
+        print(f"Ignoring {name}={text!r}: expected a number of milliseconds; using {default} ms")
+        return default
+    return value
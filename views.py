@@ -0,0 +1,286 @@
+from PyQt5.QtWidgets import QStyledItemDelegate, QStyle
+from PyQt5.QtGui import QPixmap, QFont, QColor
+from PyQt5.QtCore import Qt, QAbstractListModel, QAbstractItemModel, QModelIndex, QSize, QRect, QPoint
+
+IMAGE_SIZE = 150
+CARD_SIZE = QSize(260, 240)
+
+ProductIdRole = Qt.UserRole + 1
+CategoryRole = Qt.UserRole + 2
+ImagePathRole = Qt.UserRole + 3
+
+DETAIL_COLUMNS = ['Name', 'Category', 'Price', 'Fee', 'Units Sold', 'Stock']
+DETAIL_PAGE_SIZE = 200
+
+
+class ProductListModel(QAbstractListModel):
+    """Rows of (product id, item name, category, image path) shown in the inventory grid."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        product_id, item_name, category, image_path = self.rows[index.row()]
+        if role == Qt.DisplayRole:
+            return item_name
+        if role == ProductIdRole:
+            return product_id
+        if role == CategoryRole:
+            return category
+        if role == ImagePathRole:
+            return image_path
+        return None
+
+
+class ProductDetailsModel(QAbstractItemModel):
+    """Products, their models and their colors as a lazily expanded tree.
+
+    Rows are (product id, item name, category, data) with the live Data
+    dicts, and nothing is formatted until the view asks for a cell. Product
+    rows are handed to the view a page at a time through fetchMore, child
+    rows come straight from the Data dict when a product or model is
+    expanded, and sorting and filtering reorder product ids inside the model.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.products = {}
+        self.order = []
+        self.loaded = 0
+        self.filter_text = ''
+        self.sort_column = None
+        self.sort_order = Qt.AscendingOrder
+        self._nodes = {}
+        self._rows = {}
+
+    def set_products(self, rows):
+        self.beginResetModel()
+        self.products = {product_id: (item_name, category, data) for product_id, item_name, category, data in rows}
+        self._arrange()
+        self.endResetModel()
+
+    def set_filter(self, text):
+        self.beginResetModel()
+        self.filter_text = text.lower()
+        self._arrange()
+        self.endResetModel()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        self.sort_column, self.sort_order = column, order
+        self._arrange(keep_loaded=True)
+
+        # Only product rows move; expanded models and colors keep their rows
+        for index in persistent:
+            key = index.internalPointer()
+            row = self._rows[key[0]] if len(key) == 1 else index.row()
+            visible = self._rows[key[0]] < self.loaded
+            self.changePersistentIndex(index, self.createIndex(row, index.column(), key) if visible else QModelIndex())
+        self.layoutChanged.emit()
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.loaded < len(self.order)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(DETAIL_PAGE_SIZE, len(self.order) - self.loaded)
+        self.beginInsertRows(QModelIndex(), self.loaded, self.loaded + count - 1)
+        self.loaded += count
+        self.endInsertRows()
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(DETAIL_COLUMNS)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self.loaded
+        if parent.column() != 0:
+            return 0
+        return len(self._children(parent.internalPointer()))
+
+    def hasChildren(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self.loaded > 0
+        return parent.column() == 0 and len(parent.internalPointer()) < 3
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if parent.isValid():
+            key = parent.internalPointer() + (self._children(parent.internalPointer())[row],)
+        else:
+            key = (self.order[row],)
+        return self.createIndex(row, column, self._nodes.setdefault(key, key))
+
+    def parent(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        key = index.internalPointer()
+        if len(key) == 1:
+            return QModelIndex()
+        parent_key = self._nodes.setdefault(key[:-1], key[:-1])
+        if len(parent_key) == 1:
+            row = self._rows[parent_key[0]]
+        else:
+            row = self._children(parent_key[:-1]).index(parent_key[-1])
+        return self.createIndex(row, 0, parent_key)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return DETAIL_COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        key = index.internalPointer()
+        column = DETAIL_COLUMNS[index.column()]
+        item_name, category, data = self.products[key[0]]
+
+        if len(key) == 1:
+            if column == 'Name':
+                return item_name
+            if column == 'Category':
+                return category
+            if column in ('Units Sold', 'Stock'):
+                return str(self._product_value(key[0], column))
+            if column in ('Price', 'Fee') and data:
+                low, high = self._value_range(key[0], column)
+                return f"${low}" if low == high else f"${low} - ${high}"
+            return None
+
+        model_data = data[key[1]]
+        if len(key) == 2:
+            if column == 'Name':
+                return key[1]
+            if column in ('Price', 'Fee'):
+                return f"${model_data.get(column, 0)}"
+            if column == 'Units Sold':
+                return str(model_data.get('Units Sold', 0))
+            if column == 'Stock':
+                return str(sum(model_data['Colors'].values()))
+            return None
+
+        if column == 'Name':
+            return key[2]
+        if column == 'Units Sold':
+            return str(model_data.get('Units Sold Colors', {}).get(key[2], 0))
+        if column == 'Stock':
+            return str(model_data['Colors'][key[2]])
+        return None
+
+    def _children(self, key):
+        data = self.products[key[0]][2]
+        if len(key) == 1:
+            return list(data)
+        return list(data[key[1]]['Colors'])
+
+    def _product_value(self, product_id, column):
+        data = self.products[product_id][2]
+        if column == 'Units Sold':
+            return sum(model_data.get('Units Sold', 0) for model_data in data.values())
+        return sum(sum(model_data['Colors'].values()) for model_data in data.values())
+
+    def _value_range(self, product_id, column):
+        """Returns the lowest and highest price or fee of a product's models."""
+        values = [model_data.get(column, 0) for model_data in self.products[product_id][2].values()]
+        return (min(values), max(values)) if values else (0, 0)
+
+    def _arrange(self, keep_loaded=False):
+        order = list(self.products)
+        if self.filter_text:
+            order = [product_id for product_id in order
+                     if self.filter_text in str(self.products[product_id][0]).lower()
+                     or self.filter_text in str(self.products[product_id][1]).lower()]
+
+        column = DETAIL_COLUMNS[self.sort_column] if self.sort_column in range(len(DETAIL_COLUMNS)) else None
+        if column in ('Name', 'Category'):
+            position = DETAIL_COLUMNS.index(column)
+            order.sort(key=lambda product_id: str(self.products[product_id][position]).lower(),
+                       reverse=self.sort_order == Qt.DescendingOrder)
+        elif column in ('Units Sold', 'Stock'):
+            order.sort(key=lambda product_id: self._product_value(product_id, column),
+                       reverse=self.sort_order == Qt.DescendingOrder)
+        elif column in ('Price', 'Fee'):
+            # Cheapest model first going up, dearest model first going down
+            if self.sort_order == Qt.DescendingOrder:
+                order.sort(key=lambda product_id: self._value_range(product_id, column)[1], reverse=True)
+            else:
+                order.sort(key=lambda product_id: self._value_range(product_id, column)[0])
+
+        self.order = order
+        self._rows = {product_id: row for row, product_id in enumerate(order)}
+        self._nodes = {} if not keep_loaded else self._nodes
+        self.loaded = min(self.loaded if keep_loaded else DETAIL_PAGE_SIZE, len(order))
+
+
+class ProductCardDelegate(QStyledItemDelegate):
+    """Paints a product card (image, name and category) for visible rows only."""
+
+    def __init__(self, thumbnail_loader, parent=None):
+        super().__init__(parent)
+        self.thumbnail_loader = thumbnail_loader
+        self.placeholder = QPixmap(IMAGE_SIZE, IMAGE_SIZE)
+        self.placeholder.fill(Qt.lightGray)
+
+    def sizeHint(self, option, index):
+        return CARD_SIZE
+
+    def paint(self, painter, option, index):
+        painter.save()
+        rect = option.rect.adjusted(5, 5, -5, -5)
+
+        if option.state & QStyle.State_MouseOver:
+            painter.fillRect(rect, QColor("#e4e9ee"))
+
+        pixmap = self.product_pixmap(index.data(ImagePathRole))
+        image_rect = QRect(rect.left(), rect.top(), IMAGE_SIZE, IMAGE_SIZE)
+        painter.drawPixmap(image_rect.left() + (IMAGE_SIZE - pixmap.width()) // 2,
+                           image_rect.top() + (IMAGE_SIZE - pixmap.height()) // 2, pixmap)
+
+        font = QFont(option.font)
+        font.setPixelSize(18)
+        font.setBold(True)
+        painter.setFont(font)
+        text_rect = QRect(rect.left(), image_rect.bottom() + 10, rect.width(), rect.bottom() - image_rect.bottom() - 10)
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignTop | Qt.TextWordWrap, f"Name: {index.data(Qt.DisplayRole)}")
+
+        font.setBold(False)
+        painter.setFont(font)
+        painter.drawText(text_rect, Qt.AlignLeft | Qt.AlignBottom, f"Category: {index.data(CategoryRole)}")
+        painter.restore()
+
+    def product_pixmap(self, image_path):
+        pixmap = self.thumbnail_loader.request(image_path)
+        return self.placeholder if pixmap is None else pixmap
+
+
+def visible_rows(view):
+    """Returns the model rows whose cards intersect the view's viewport.
+
+    Cards are sampled at their centers, clamped to the viewport, starting one
+    card above it so that a top row scrolled partly out of view is included.
+    """
+    grid = view.gridSize()
+    viewport = view.viewport().rect()
+    rows = set()
+    for y in range(viewport.top() - grid.height(), viewport.bottom() + grid.height(), grid.height()):
+        sample_y = max(viewport.top(), min(y + grid.height() // 2, viewport.bottom()))
+        for x in range(viewport.left(), viewport.right() + 1, grid.width()):
+            index = view.indexAt(QPoint(x + grid.width() // 2, sample_y))
+            if index.isValid():
+                rows.add(index.row())
+    return sorted(rows)